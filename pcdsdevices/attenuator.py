@@ -1,21 +1,136 @@
 """
 Module for `Attenuator` and related classes.
 """
+import asyncio
 import logging
 import time
+from collections.abc import MutableMapping, Sequence
+from threading import Event, Lock, RLock
 
 import numpy as np
-from ophyd.device import Component as Cpt
+from ophyd.device import Device, Component as Cpt
 from ophyd.device import FormattedComponent as FCpt
 from ophyd.pv_positioner import PVPositioner
-from ophyd.signal import Signal, EpicsSignal, EpicsSignalRO
+from ophyd.signal import AttributeSignal, Signal, EpicsSignal, EpicsSignalRO
 
 from .inout import InOutPositioner
 from .mv_interface import FltMvInterface
+from .state import move_states
 
 logger = logging.getLogger(__name__)
 MAX_FILTERS = 12
 
+# Material name -> function of energy returning the attenuation length
+_attenuation_lengths = {}
+# Number of set bits in each blade combination
+_popcount = np.array([bin(i).count('1') for i in range(2**MAX_FILTERS)])
+
+
+def register_material(material, attenuation_length):
+    """
+    Teach the local transmission solver about a filter material.
+
+    No materials are registered by default, so this must be called for each
+    material in use before `AttBase.transmission_table` can be built.
+
+    Parameters
+    ----------
+    material: ``str``
+        The material name, as reported by the `Filter` ``material`` signal.
+
+    attenuation_length: ``callable``
+        Function that takes the attenuator's ``energy`` and returns the
+        attenuation length of the material, in the same units as the
+        `Filter` ``thickness``.
+    """
+    _attenuation_lengths[material] = attenuation_length
+
+
+class TransmissionTable:
+    """
+    Transmission of every combination of a set of filter blades.
+
+    Combination ``k`` has blade ``i`` inserted if bit ``i`` of ``k`` is set.
+    The transmissions are kept sorted, so the combinations on either side of
+    a requested transmission are found by binary search.
+
+    Parameters
+    ----------
+    blade_transmissions: ``list`` of ``float``
+        The transmission of each blade when inserted.
+
+    fixed: ``dict``, optional
+        Blades that cannot be moved, mapping blade index to ``True`` if it is
+        stuck inserted or ``False`` if it is stuck removed. Only combinations
+        that agree with these are considered.
+    """
+    def __init__(self, blade_transmissions, fixed=None):
+        blades = np.asarray(blade_transmissions, dtype=float)
+        if len(blades) > MAX_FILTERS:
+            raise ValueError('Cannot tabulate more than {} filters'
+                             ''.format(MAX_FILTERS))
+        self.num_blades = len(blades)
+        self.blade_transmissions = blades
+        combos = np.arange(2**self.num_blades)
+        inserted = (combos[:, None] >> np.arange(self.num_blades)) & 1
+        mask = np.ones(len(combos), dtype=bool)
+        for index, state in (fixed or {}).items():
+            mask &= inserted[:, index] == int(bool(state))
+        combos = combos[mask]
+        trans = np.prod(np.where(inserted[mask], blades, 1), axis=1)
+        order = np.argsort(trans, kind='mergesort')
+        self.transmissions = trans[order]
+        self.combinations = combos[order]
+
+    def floor_ceil(self, transmission):
+        """
+        The achievable transmissions just below and just above a goal.
+
+        Returns
+        -------
+        floor, ceil: ``tuple``
+            Each is a ``(combination, transmission)`` pair. At the ends of
+            the range, both are the same.
+        """
+        index = np.searchsorted(self.transmissions, transmission)
+        upper = min(index, len(self.transmissions) - 1)
+        lower = max(index - 1, 0)
+        if self.transmissions[upper] == transmission:
+            lower = upper
+        return ((int(self.combinations[lower]),
+                 float(self.transmissions[lower])),
+                (int(self.combinations[upper]),
+                 float(self.transmissions[upper])))
+
+    def nearest(self, transmission):
+        """
+        The achievable transmission closest to a goal.
+
+        Ties go to the floor, like the attenuator IOC.
+
+        Returns
+        -------
+        combination, transmission: ``tuple``
+        """
+        floor, ceil = self.floor_ceil(transmission)
+        if abs(transmission - ceil[1]) < abs(transmission - floor[1]):
+            return ceil
+        return floor
+
+    def transmission(self, combination):
+        """
+        The transmission of any combination, including ones excluded by
+        ``fixed``.
+        """
+        return float(np.prod(np.where(self.states(combination),
+                                      self.blade_transmissions, 1)))
+
+    def states(self, combination):
+        """
+        ``True`` for each blade that is inserted in a combination.
+        """
+        return [bool(combination >> i & 1) for i in range(self.num_blades)]
+
 
 class Filter(InOutPositioner):
     """
@@ -47,6 +162,290 @@ class FeeFilter(InOutPositioner):
     _unknown = 'XSTN'
 
 
+class BladeTelemetry(Device):
+    """
+    Opt-in record of how an attenuator's filter blades move.
+
+    Once `enable` is called, every blade's insertions and removals, the
+    duration of moves started from this session and changes of the blade's
+    ``stuck`` flag are counted. The most recent events are also kept in a
+    fixed-size ring buffer of ``(time, blade, event, duration)`` records.
+    Per-blade totals, mean move times and move time histograms are readable
+    as signals of this device.
+
+    This is included as the lazy ``telemetry`` component of `AttBase`, so it
+    is only built for attenuators that use it, and is turned on with
+    `AttBase.enable_telemetry`.
+    """
+    INSERT = 0
+    REMOVE = 1
+    STUCK = 2
+    # Upper edges of the move duration histogram bins, in seconds. A last
+    # bin collects anything slower.
+    move_time_edges = (0.5, 1, 2, 5, 10, 30)
+
+    insertions = Cpt(AttributeSignal, attr='insertion_counts', kind='normal')
+    removals = Cpt(AttributeSignal, attr='removal_counts', kind='normal')
+    stuck_events = Cpt(AttributeSignal, attr='stuck_counts', kind='normal')
+    mean_move_time = Cpt(AttributeSignal, attr='mean_move_times',
+                         kind='normal')
+    move_time_histogram = Cpt(AttributeSignal, attr='move_time_histograms',
+                              kind='normal')
+
+    def __init__(self, prefix='', *, name, size=1024, **kwargs):
+        self._lock = RLock()
+        self._filters = []
+        self._subs = []
+        self._resize(0, size)
+        super().__init__(prefix, name=name, **kwargs)
+
+    @property
+    def enabled(self):
+        """
+        ``True`` if blade motion is being recorded.
+        """
+        return bool(self._subs)
+
+    def enable(self, filters, size=None):
+        """
+        Start recording the motion of some filter blades.
+
+        Parameters
+        ----------
+        filters: ``list`` of `Filter`
+            The blades to watch, normally the attenuator's ``filters``.
+
+        size: ``int``, optional
+            Number of events to keep in the ring buffer.
+        """
+        with self._lock:
+            self.disable()
+            self._filters = list(filters)
+            self._resize(len(self._filters), size or len(self._events))
+            for index, filt in enumerate(self._filters):
+                try:
+                    self._last_state[index] = self._classify(
+                        filt, filt.state.get())
+                except Exception:
+                    logger.debug('', exc_info=True)
+                self._subscribe(filt, self._make_start_cb(index),
+                                filt.SUB_START)
+                self._subscribe(filt, self._make_state_cb(index),
+                                filt.SUB_STATE)
+                stuck = getattr(filt, 'stuck', None)
+                if stuck is not None:
+                    self._last_stuck[index] = bool(stuck.get())
+                    self._subscribe(stuck, self._make_stuck_cb(index),
+                                    stuck.SUB_VALUE)
+
+    def disable(self):
+        """
+        Stop recording. The collected statistics are kept.
+        """
+        with self._lock:
+            for obj, cid in self._subs:
+                obj.unsubscribe(cid)
+            self._subs = []
+
+    def clear(self):
+        """
+        Reset every count and empty the ring buffer.
+        """
+        with self._lock:
+            self._resize(len(self._filters), len(self._events))
+
+    @property
+    def events(self):
+        """
+        The buffered events, oldest first, as a NumPy record array with
+        ``time``, ``blade``, ``event`` and ``duration`` fields. ``duration``
+        is ``nan`` for stuck events and moves not started from here.
+        """
+        with self._lock:
+            if self._count < len(self._events):
+                return self._events[:self._count].copy()
+            return np.roll(self._events, -self._index)
+
+    @property
+    def insertion_counts(self):
+        """
+        Number of times each blade was inserted.
+        """
+        return self._insertions.copy()
+
+    @property
+    def removal_counts(self):
+        """
+        Number of times each blade was removed.
+        """
+        return self._removals.copy()
+
+    @property
+    def stuck_counts(self):
+        """
+        Number of times each blade was flagged as stuck.
+        """
+        return self._stuck.copy()
+
+    @property
+    def mean_move_times(self):
+        """
+        Mean duration in seconds of each blade's timed moves.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._move_time / self._timed_moves
+
+    @property
+    def move_time_histograms(self):
+        """
+        Count of buffered moves per blade in each ``move_time_edges`` bin.
+        """
+        events = self.events
+        moves = events[np.isfinite(events['duration'])]
+        nbins = len(self.move_time_edges) + 1
+        bins = np.searchsorted(self.move_time_edges, moves['duration'],
+                               side='right')
+        hist = np.zeros((len(self._filters), nbins), dtype=int)
+        np.add.at(hist, (moves['blade'], bins), 1)
+        return hist
+
+    def _resize(self, nblades, size):
+        self._events = np.zeros(size, dtype=[('time', 'f8'), ('blade', 'i2'),
+                                             ('event', 'i1'),
+                                             ('duration', 'f8')])
+        self._index = 0
+        self._count = 0
+        self._insertions = np.zeros(nblades, dtype=int)
+        self._removals = np.zeros(nblades, dtype=int)
+        self._stuck = np.zeros(nblades, dtype=int)
+        self._move_time = np.zeros(nblades)
+        self._timed_moves = np.zeros(nblades, dtype=int)
+        self._last_state = [None] * nblades
+        self._last_stuck = [False] * nblades
+        self._started = [None] * nblades
+        # (slot, time) of an arrival that came before its move's start
+        self._early = [None] * nblades
+
+    def _subscribe(self, obj, callback, event_type):
+        cid = obj.subscribe(callback, event_type=event_type, run=False)
+        self._subs.append((obj, cid))
+
+    def _record(self, blade, event, duration=np.nan, timestamp=None):
+        """
+        Add one event to the ring buffer and return its slot.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        slot = self._index
+        self._events[slot] = (timestamp, blade, event, duration)
+        self._index = (self._index + 1) % len(self._events)
+        self._count += 1
+        return slot
+
+    def _add_move_time(self, blade, duration):
+        self._move_time[blade] += duration
+        self._timed_moves[blade] += 1
+
+    @staticmethod
+    def _classify(filt, value):
+        """
+        Return ``INSERT`` or ``REMOVE`` for a settled state, else ``None``.
+        """
+        index = filt.get_state(value).value
+        if index in filt._in_indices:
+            return BladeTelemetry.INSERT
+        if index in filt._out_indices:
+            return BladeTelemetry.REMOVE
+        return None
+
+    def _make_start_cb(self, blade):
+        def move_started(*args, timestamp=None, **kwargs):
+            # The positioner reports the start after asking for the move,
+            # with the time it asked, so a fast move may already be done
+            if timestamp is None:
+                timestamp = time.time()
+            with self._lock:
+                early, self._early[blade] = self._early[blade], None
+                if early is not None and early[1] >= timestamp:
+                    slot, arrived = early
+                    duration = arrived - timestamp
+                    self._events[slot]['duration'] = duration
+                    self._add_move_time(blade, duration)
+                else:
+                    self._started[blade] = timestamp
+        return move_started
+
+    def _make_state_cb(self, blade):
+        filt = self._filters[blade]
+
+        def state_changed(*args, value, **kwargs):
+            try:
+                event = self._classify(filt, value)
+            except Exception:
+                logger.debug('', exc_info=True)
+                return
+            with self._lock:
+                if event is None or event == self._last_state[blade]:
+                    return
+                self._last_state[blade] = event
+                if event == self.INSERT:
+                    self._insertions[blade] += 1
+                else:
+                    self._removals[blade] += 1
+                arrived = time.time()
+                if self._started[blade] is not None:
+                    duration = arrived - self._started[blade]
+                    self._started[blade] = None
+                    self._add_move_time(blade, duration)
+                    self._record(blade, event, duration, arrived)
+                else:
+                    slot = self._record(blade, event, timestamp=arrived)
+                    self._early[blade] = (slot, arrived)
+        return state_changed
+
+    def _make_stuck_cb(self, blade):
+        def stuck_changed(*args, value, **kwargs):
+            stuck = bool(value)
+            with self._lock:
+                if stuck and not self._last_stuck[blade]:
+                    self._stuck[blade] += 1
+                    self._record(blade, self.STUCK)
+                self._last_stuck[blade] = stuck
+        return stuck_changed
+
+
+class FilterList(Sequence):
+    """
+    The filter blades of an attenuator, in order.
+
+    Blades are lazy components, so each one is only created when it is
+    first taken from this list.
+
+    Parameters
+    ----------
+    device: `AttBase`
+        The attenuator that owns the blades.
+
+    names: ``list`` of ``str``
+        The attribute names of the blade components.
+    """
+    def __init__(self, device, names):
+        self._device = device
+        self._names = list(names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [getattr(self._device, name)
+                    for name in self._names[index]]
+        return getattr(self._device, self._names[index])
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return 'FilterList({})'.format(self._names)
+
+
 class AttBase(FltMvInterface, PVPositioner):
     """
     Base class for the attenuators.
@@ -74,6 +473,9 @@ class AttBase(FltMvInterface, PVPositioner):
     # Aux Signals
     calcpend = Cpt(EpicsSignalRO, ':COM:CALCP', kind='omitted')
 
+    # Blade motion statistics, see enable_telemetry. Only built when used.
+    telemetry = Cpt(BladeTelemetry, '', kind='omitted', lazy=True)
+
     egu = ''  # Transmission is a unitless ratio
     done_value = 0
 
@@ -84,13 +486,14 @@ class AttBase(FltMvInterface, PVPositioner):
 
     def __init__(self, prefix, *, name, **kwargs):
         super().__init__(prefix, name=name, limits=(0, 1), **kwargs)
-        self.filters = []
         self._has_subscribed_state = False
+        self._trans_table = None
+        names = []
         for i in range(1, MAX_FILTERS + 1):
-            try:
-                self.filters.append(getattr(self, 'filter{}'.format(i)))
-            except AttributeError:
+            if 'filter{}'.format(i) not in self.component_names:
                 break
+            names.append('filter{}'.format(i))
+        self.filters = FilterList(self, names)
 
     @property
     def actuate_value(self):
@@ -101,13 +504,18 @@ class AttBase(FltMvInterface, PVPositioner):
 
         This will wait until a pending calculation completes before returning.
         """
-        timeout = 1
-        start = time.time()
-        while self.calcpend.get() != 0:
-            if time.time() - start > timeout:
-                break
-            time.sleep(0.01)
+        self.wait_calc()
+        return self._pick_actuate_value()
+
+    async def async_actuate_value(self, timeout=1):
+        """
+        Coroutine version of `actuate_value`, so that many attenuators can
+        wait for their calculations at once.
+        """
+        await self.async_wait_calc(timeout=timeout)
+        return self._pick_actuate_value()
 
+    def _pick_actuate_value(self):
         goal = self.setpoint.get()
         ceil = self.trans_ceil.get()
         floor = self.trans_floor.get()
@@ -117,6 +525,245 @@ class AttBase(FltMvInterface, PVPositioner):
         else:
             return 3
 
+    def wait_calc(self, timeout=1):
+        """
+        Wait for the IOC to finish a pending transmission calculation.
+
+        This waits on a ``calcpend`` subscription instead of polling.
+
+        Parameters
+        ----------
+        timeout: ``float``, optional
+            Maximum time to wait in seconds.
+
+        Returns
+        -------
+        done: ``bool``
+            ``False`` if the calculation was still pending at the timeout.
+        """
+        event = Event()
+
+        def calc_done(*args, value, **kwargs):
+            if value == 0:
+                event.set()
+
+        cid = self.calcpend.subscribe(calc_done, run=False)
+        try:
+            # Covers a calculation that finished before we subscribed
+            if self.calcpend.get() == 0 or event.wait(timeout):
+                return True
+        finally:
+            self.calcpend.unsubscribe(cid)
+        logger.debug('%s calculation still pending after %ss', self.name,
+                     timeout)
+        return False
+
+    async def async_wait_calc(self, timeout=1):
+        """
+        Coroutine version of `wait_calc`.
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        def finish():
+            if not future.done():
+                future.set_result(True)
+
+        def calc_done(*args, value, **kwargs):
+            if value == 0:
+                loop.call_soon_threadsafe(finish)
+
+        cid = self.calcpend.subscribe(calc_done, run=False)
+        try:
+            if self.calcpend.get() == 0:
+                return True
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.debug('%s calculation still pending after %ss',
+                         self.name, timeout)
+            return False
+        finally:
+            self.calcpend.unsubscribe(cid)
+
+    def enable_telemetry(self, size=1024):
+        """
+        Start recording the motion of this attenuator's filter blades.
+
+        The statistics can then be read from ``telemetry``. See
+        `BladeTelemetry`.
+
+        Parameters
+        ----------
+        size: ``int``, optional
+            Number of recent blade events to keep.
+        """
+        self.telemetry.enable(self.filters, size=size)
+
+    def disable_telemetry(self):
+        """
+        Stop recording blade motion, keeping what was collected.
+        """
+        self.telemetry.disable()
+
+    def transmission_table(self, energy=None):
+        """
+        Tabulate the transmission of every combination of this device's
+        filter blades.
+
+        Stuck blades are held in their current state. The blade thicknesses
+        and materials are read when the table is built, and the table is
+        reused until the energy or the stuck blades change, or
+        `clear_transmission_table` is called.
+
+        Parameters
+        ----------
+        energy: ``number``, optional
+            The energy to calculate for. If omitted, use the ``energy``
+            signal.
+
+        Returns
+        -------
+        table: `TransmissionTable`
+
+        Raises
+        ------
+        ValueError:
+            If a blade's material has not been given to `register_material`
+            or the blades have no thickness and material.
+        """
+        if energy is None:
+            energy = self.energy.get()
+        fixed = {}
+        for index, filt in enumerate(self.filters):
+            stuck = getattr(filt, 'stuck', None)
+            if stuck is not None and stuck.get():
+                fixed[index] = filt.inserted
+        key = (energy, tuple(sorted(fixed.items())))
+        if self._trans_table is not None and self._trans_table[0] == key:
+            return self._trans_table[1]
+        blades = []
+        for index, filt in enumerate(self.filters):
+            thickness, material = self._blade_material(index, filt)
+            try:
+                length = _attenuation_lengths[material](energy)
+            except KeyError:
+                raise ValueError('Unknown filter material {!r} for {}, '
+                                 'add it with register_material'
+                                 ''.format(material, filt.name))
+            blades.append(np.exp(-thickness / length))
+        table = TransmissionTable(blades, fixed=fixed)
+        self._trans_table = (key, table)
+        return table
+
+    def _blade_material(self, index, filt):
+        """
+        The thickness and material of one filter blade.
+        """
+        try:
+            return filt.thickness.get(), filt.material.get()
+        except AttributeError:
+            raise ValueError('{} has no thickness and material'
+                             ''.format(filt.name))
+
+    def clear_transmission_table(self):
+        """
+        Discard the cached `transmission_table`, e.g. after changing a
+        blade's thickness or material.
+        """
+        self._trans_table = None
+
+    def solve_transmission(self, transmission, energy=None):
+        """
+        Find the filter blade states that best achieve a transmission.
+
+        Parameters
+        ----------
+        transmission: ``float``
+            The desired transmission.
+
+        energy: ``number``, optional
+            The energy to calculate for. If omitted, use the ``energy``
+            signal.
+
+        Returns
+        -------
+        states, transmission: ``tuple``
+            ``True`` for each blade in ``filters`` that should be inserted,
+            and the transmission this achieves.
+        """
+        table = self.transmission_table(energy=energy)
+        combination, achieved = table.nearest(transmission)
+        return table.states(combination), achieved
+
+    def set_transmission(self, transmission, energy=None, wait=False,
+                         timeout=None, check_ioc=False, rtol=1e-3):
+        """
+        Move the filter blades straight to the nearest achievable
+        transmission using `solve_transmission`, rather than waiting on the
+        IOC's calculation.
+
+        Parameters
+        ----------
+        transmission: ``float``
+            The desired transmission.
+
+        energy: ``number``, optional
+            The energy to calculate for. If omitted, use the ``energy``
+            signal.
+
+        wait: ``bool``, optional
+            If ``True``, wait for the blades to finish moving.
+
+        timeout: ``float``, optional
+            Maximum time to wait for the blades to move.
+
+        check_ioc: ``bool``, optional
+            If ``True``, first run `check_transmission` to compare the local
+            calculation with the IOC's, logging a warning if they disagree.
+
+        rtol: ``float``, optional
+            Relative tolerance used by ``check_ioc``.
+
+        Returns
+        -------
+        status: `StateGroupStatus`
+        """
+        states, achieved = self.solve_transmission(transmission,
+                                                   energy=energy)
+        logger.debug('%s local solution for %s: %s (%s)', self.name,
+                     transmission, achieved, states)
+        if check_ioc:
+            self.check_transmission(rtol=rtol)
+        filters, targets = _blade_moves(self.filters, states)
+        return move_states(filters, targets, timeout=timeout, wait=wait)
+
+    def check_transmission(self, rtol=1e-3):
+        """
+        Compare the local `transmission_table` with the IOC's calculation.
+
+        The transmission of the blades that are inserted right now, at the
+        ``energy`` the IOC is using, is checked against the IOC's
+        ``readback``. Nothing is written to the IOC.
+
+        Parameters
+        ----------
+        rtol: ``float``, optional
+            Relative tolerance of the comparison.
+
+        Returns
+        -------
+        agrees: ``bool``
+        """
+        table = self.transmission_table()
+        local = table.transmission(_current_combination(self))
+        ioc_value = self.readback.get()
+        agrees = bool(np.isclose(local, ioc_value, rtol=rtol))
+        if not agrees:
+            logger.warning('%s local transmission %s does not match the '
+                           'IOC readback %s', self.name, local, ioc_value)
+        return agrees
+
     def set_energy(self, energy=None):
         """
         Sets the energy to use for transmission calculations.
@@ -246,6 +893,26 @@ class AttBase3rd(AttBase):
 class FeeAtt(AttBase):
     """
     Old attenuator IOC in the FEE.
+
+    This IOC does not report the thickness and material of its filters. To
+    use `transmission_table` and the functions built on it, such as
+    `set_combined_attenuation`, give the filter thicknesses here.
+
+    Parameters
+    ----------
+    prefix: ``str``, optional
+        The PV prefix of the attenuator.
+
+    name: ``str``, optional
+        The name of the device.
+
+    thicknesses: ``list`` of ``float``, optional
+        The thickness of each filter, in order, in the same units as the
+        material's attenuation length. Defaults to ``filter_thicknesses``.
+
+    material: ``str``, optional
+        The material of every filter, as given to `register_material`.
+        Defaults to ``filter_material``.
     """
     # Positioner Signals
     setpoint = Cpt(EpicsSignal, ':RDES', kind='normal')
@@ -264,43 +931,105 @@ class FeeAtt(AttBase):
     calcpend = Cpt(Signal, value=0)
 
     # Hardcode filters for FEE, because there is only one.
-    filter1 = FCpt(FeeFilter, '{self._filter_prefix}1')
-    filter2 = FCpt(FeeFilter, '{self._filter_prefix}2')
-    filter3 = FCpt(FeeFilter, '{self._filter_prefix}3')
-    filter4 = FCpt(FeeFilter, '{self._filter_prefix}4')
-    filter5 = FCpt(FeeFilter, '{self._filter_prefix}5')
-    filter6 = FCpt(FeeFilter, '{self._filter_prefix}6')
-    filter7 = FCpt(FeeFilter, '{self._filter_prefix}7')
-    filter8 = FCpt(FeeFilter, '{self._filter_prefix}8')
-    filter9 = FCpt(FeeFilter, '{self._filter_prefix}9')
+    filter1 = FCpt(FeeFilter, '{self._filter_prefix}1', lazy=True)
+    filter2 = FCpt(FeeFilter, '{self._filter_prefix}2', lazy=True)
+    filter3 = FCpt(FeeFilter, '{self._filter_prefix}3', lazy=True)
+    filter4 = FCpt(FeeFilter, '{self._filter_prefix}4', lazy=True)
+    filter5 = FCpt(FeeFilter, '{self._filter_prefix}5', lazy=True)
+    filter6 = FCpt(FeeFilter, '{self._filter_prefix}6', lazy=True)
+    filter7 = FCpt(FeeFilter, '{self._filter_prefix}7', lazy=True)
+    filter8 = FCpt(FeeFilter, '{self._filter_prefix}8', lazy=True)
+    filter9 = FCpt(FeeFilter, '{self._filter_prefix}9', lazy=True)
     num_att = 9
 
-    def __init__(self, prefix='SATT:FEE1:320', *, name='FeeAtt', **kwargs):
+    # Filter configuration for transmission_table
+    filter_thicknesses = None
+    filter_material = 'Si'
+
+    def __init__(self, prefix='SATT:FEE1:320', *, name='FeeAtt',
+                 thicknesses=None, material=None, **kwargs):
         self._filter_prefix = prefix[:-1]
+        if thicknesses is not None:
+            if len(thicknesses) != self.num_att:
+                raise ValueError('Expected {} filter thicknesses, got {}'
+                                 ''.format(self.num_att, len(thicknesses)))
+            self.filter_thicknesses = list(thicknesses)
+        if material is not None:
+            self.filter_material = material
         super().__init__(prefix, name=name, **kwargs)
 
+    def _blade_material(self, index, filt):
+        if self.filter_thicknesses is None:
+            raise ValueError('{} has no filter thicknesses, pass them to '
+                             'FeeAtt as thicknesses'.format(self.name))
+        return self.filter_thicknesses[index], self.filter_material
+
+
+# (base class, number of filters) -> attenuator class
+_att_class_cache = {}
+_att_class_lock = Lock()
+
 
-def _make_att_classes(max_filters, base, name):
+def _make_att_class(base, name, n_filters):
     """
-    Generate all possible subclasses.
+    Get the subclass of ``base`` with ``n_filters`` `Filter` components,
+    creating it on first use.
     """
-    att_classes = {}
-    for i in range(1, max_filters + 1):
-        att_filters = {}
-        for n in range(1, i + 1):
-            comp = Cpt(Filter, ':{:02}'.format(n))
-            att_filters['filter{}'.format(n)] = comp
+    key = (base, n_filters)
+    try:
+        return _att_class_cache[key]
+    except KeyError:
+        pass
+    with _att_class_lock:
+        if key not in _att_class_cache:
+            att_filters = {}
+            for n in range(1, n_filters + 1):
+                comp = Cpt(Filter, ':{:02}'.format(n), lazy=True)
+                att_filters['filter{}'.format(n)] = comp
 
-        cls_name = '{}{}'.format(name, i)
-        cls = type(cls_name, (base,), att_filters)
-        # Store the number of filters
-        cls.num_att = i
-        att_classes[i] = cls
-    return att_classes
+            cls_name = '{}{}'.format(name, n_filters)
+            cls = type(cls_name, (base,), att_filters)
+            # Store the number of filters
+            cls.num_att = n_filters
+            _att_class_cache[key] = cls
+        return _att_class_cache[key]
 
 
-_att_classes = _make_att_classes(MAX_FILTERS, AttBase, 'Attenuator')
-_att3_classes = _make_att_classes(MAX_FILTERS, AttBase3rd, 'Attenuator3rd')
+class _AttClasses(MutableMapping):
+    """
+    Mapping from number of filters to the attenuator classes for one base.
+
+    Classes are created the first time they are looked up. Assigning to a
+    key replaces the class used for that number of filters.
+    """
+    def __init__(self, max_filters, base, name):
+        self._max_filters = max_filters
+        self._base = base
+        self._name = name
+
+    def __getitem__(self, n_filters):
+        if n_filters not in range(1, self._max_filters + 1):
+            raise KeyError(n_filters)
+        return _make_att_class(self._base, self._name, n_filters)
+
+    def __setitem__(self, n_filters, cls):
+        if n_filters not in range(1, self._max_filters + 1):
+            raise KeyError(n_filters)
+        _att_class_cache[(self._base, n_filters)] = cls
+
+    def __delitem__(self, n_filters):
+        # The default class is created again on the next lookup
+        del _att_class_cache[(self._base, n_filters)]
+
+    def __iter__(self):
+        return iter(range(1, self._max_filters + 1))
+
+    def __len__(self):
+        return self._max_filters
+
+
+_att_classes = _AttClasses(MAX_FILTERS, AttBase, 'Attenuator')
+_att3_classes = _AttClasses(MAX_FILTERS, AttBase3rd, 'Attenuator3rd')
 
 
 def Attenuator(prefix, n_filters, *, name, use_3rd=False, **kwargs):
@@ -335,12 +1064,235 @@ def Attenuator(prefix, n_filters, *, name, use_3rd=False, **kwargs):
     return cls(prefix, name=name, **kwargs)
 
 
-'''
-# WIP
-def set_combined_attenuation(attenuation, *attenuators):
-    for i in range(len(attenuators)):
-        if i < len(attenuators)-1:
-            attenuators[i].actuate_value(force_ceil=True)
-        else:
-            attenuators[i].actuate_value()
-'''
+def solve_combined_attenuation(transmission, *attenuators, energy=None,
+                               rtol=1e-3):
+    """
+    Find the blade states of several attenuators in series that best achieve
+    a combined transmission.
+
+    Of the combinations whose transmission is within ``rtol`` of the
+    closest achievable one, the one that moves the fewest blades from their
+    current states is chosen.
+
+    The search uses the product structure of the problem: the largest
+    attenuator's `TransmissionTable` is binary searched for each
+    combination of the others, and partial combinations that cannot come
+    close enough to the goal, even with the remaining blades all in or all
+    out, are pruned as they are built. Only the partial combinations that
+    can reach the fewest blade moves are expanded in full.
+
+    Parameters
+    ----------
+    transmission: ``float``
+        The desired combined transmission.
+
+    attenuators: `AttBase`
+        The attenuators in the beam. Each must support `transmission_table`.
+
+    energy: ``number``, optional
+        The energy to calculate for. If omitted, each attenuator uses its own
+        ``energy`` signal.
+
+    rtol: ``float``, optional
+        Combinations within this fraction of ``transmission`` of the best
+        one are considered equally good.
+
+    Returns
+    -------
+    states, transmission: ``tuple``
+        A ``list`` with, for each attenuator, ``True`` for each blade in its
+        ``filters`` that should be inserted, and the combined transmission
+        this achieves.
+    """
+    if not attenuators:
+        raise ValueError('Need at least one attenuator')
+    tables = [att.transmission_table(energy=energy) for att in attenuators]
+    current = [_current_combination(att) for att in attenuators]
+    combos, achieved = _solve_combined(transmission, tables, current, rtol)
+    states = [table.states(combo) for table, combo in zip(tables, combos)]
+    return states, achieved
+
+
+def set_combined_attenuation(transmission, *attenuators, energy=None,
+                             rtol=1e-3, wait=False, timeout=None):
+    """
+    Move several attenuators in series to a combined transmission.
+
+    The blades are chosen with `solve_combined_attenuation`, and only the
+    ones that need to change are moved, all at once.
+
+    Parameters
+    ----------
+    transmission: ``float``
+        The desired combined transmission.
+
+    attenuators: `AttBase`
+        The attenuators in the beam.
+
+    energy: ``number``, optional
+        The energy to calculate for. If omitted, each attenuator uses its own
+        ``energy`` signal.
+
+    rtol: ``float``, optional
+        Passed to `solve_combined_attenuation`.
+
+    wait: ``bool``, optional
+        If ``True``, wait for the blades to finish moving.
+
+    timeout: ``float``, optional
+        Maximum time to wait for the blades to move.
+
+    Returns
+    -------
+    status: `StateGroupStatus`
+        ``Status`` for every blade that moves.
+    """
+    states, achieved = solve_combined_attenuation(transmission, *attenuators,
+                                                  energy=energy, rtol=rtol)
+    logger.debug('combined solution for %s: %s', transmission, achieved)
+    filters = []
+    targets = []
+    for att, att_states in zip(attenuators, states):
+        att_filters, att_targets = _blade_moves(att.filters, att_states)
+        filters.extend(att_filters)
+        targets.extend(att_targets)
+    return move_states(filters, targets, timeout=timeout, wait=wait)
+
+
+def _blade_moves(filters, states):
+    """
+    The blades that need to move to reach ``states``, and their targets.
+
+    Blades already in their target state and blades flagged as stuck are
+    left out.
+
+    Returns
+    -------
+    filters, targets: ``tuple`` of ``list``
+    """
+    moves = []
+    targets = []
+    for filt, state in zip(filters, states):
+        stuck = getattr(filt, 'stuck', None)
+        if stuck is not None and stuck.get():
+            if bool(state) != bool(filt.inserted):
+                logger.warning('%s is stuck and cannot be %s, the '
+                               'transmission will not be as planned',
+                               filt.name,
+                               'inserted' if state else 'removed')
+            continue
+        if state and not filt.inserted:
+            moves.append(filt)
+            targets.append(filt.in_states[0])
+        elif not state and not filt.removed:
+            moves.append(filt)
+            targets.append(filt.out_states[0])
+    return moves, targets
+
+
+def _current_combination(att):
+    """
+    The combination number of an attenuator's currently inserted blades.
+    """
+    return sum(1 << i for i, filt in enumerate(att.filters) if filt.inserted)
+
+
+def _solve_combined(target, tables, current, rtol):
+    """
+    Search the joint combinations of several `TransmissionTable`.
+
+    Returns the chosen combination number for each table and the combined
+    transmission.
+    """
+    inner_index = max(range(len(tables)),
+                      key=lambda i: len(tables[i].transmissions))
+    outer_indices = [i for i in range(len(tables)) if i != inner_index]
+    inner = tables[inner_index]
+
+    # A greedy pass gives an error that the best answer can only beat. The
+    # slack covers rounding, since products taken in a different order can
+    # differ in the last bits.
+    greedy = 1.0
+    for i in outer_indices + [inner_index]:
+        goal = target / greedy if greedy > 0 else np.inf
+        greedy *= tables[i].nearest(goal)[1]
+    bound = (abs(greedy - target) + rtol * target
+             + 1e-9 * max(target, greedy))
+
+    trans = np.ones(1)
+    moves = np.zeros(1, dtype=int)
+    combos = np.zeros((1, 0), dtype=int)
+    for n, i in enumerate(outer_indices):
+        table = tables[i]
+        rest = [tables[j] for j in outer_indices[n + 1:]] + [inner]
+        rest_min = np.prod([t.transmissions[0] for t in rest])
+        rest_max = np.prod([t.transmissions[-1] for t in rest])
+        size = len(table.combinations)
+        trans = np.multiply.outer(trans, table.transmissions).ravel()
+        moves = np.add.outer(
+            moves, _popcount[table.combinations ^ current[i]]).ravel()
+        combos = np.hstack([np.repeat(combos, size, axis=0),
+                            np.tile(table.combinations,
+                                    len(combos))[:, None]])
+        keep = ((trans * rest_max >= target - bound)
+                & (trans * rest_min <= target + bound))
+        trans, moves, combos = trans[keep], moves[keep], combos[keep]
+
+    values = inner.transmissions
+    last = len(values) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index = np.searchsorted(values, target / trans)
+        below = values[np.clip(index - 1, 0, last)] * trans
+        above = values[np.clip(index, 0, last)] * trans
+        error = np.minimum(np.abs(below - target), np.abs(above - target))
+        best = error.min()
+        tol = best * (1 + 1e-9) + rtol * target
+        # Drop the partial combinations that have nothing within tolerance
+        near = error <= tol
+        trans, moves, combos = trans[near], moves[near], combos[near]
+        left = np.searchsorted(values, (target - tol) / trans, side='left')
+        right = np.searchsorted(values, (target + tol) / trans, side='right')
+    counts = np.maximum(right - left, 0)
+    # Only expand the partial combinations that can reach the fewest moves,
+    # using a range minimum over the inner table's moves
+    inner_moves = _popcount[inner.combinations ^ current[inner_index]]
+    reach = np.full(len(trans), np.iinfo(int).max)
+    has = counts > 0
+    reach[has] = moves[has] + _range_min(inner_moves, left[has], right[has])
+    counts[reach > reach.min()] = 0
+    owner = np.repeat(np.arange(len(trans)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                 counts)
+    position = left[owner] + offset
+    totals = trans[owner] * values[position]
+    errors = np.abs(totals - target)
+    total_moves = moves[owner] + inner_moves[position]
+    choice = np.lexsort((errors, total_moves))[0]
+
+    result = [0] * len(tables)
+    for n, i in enumerate(outer_indices):
+        result[i] = int(combos[owner[choice], n])
+    result[inner_index] = int(inner.combinations[position[choice]])
+    return result, float(totals[choice])
+
+
+def _range_min(values, left, right):
+    """
+    The minimum of ``values[left[k]:right[k]]`` for every ``k``.
+
+    Every range must be non-empty. A table of minimums over power of two
+    lengths makes each lookup two reads.
+    """
+    levels = [values]
+    while 2 ** len(levels) <= len(values):
+        step = 2 ** (len(levels) - 1)
+        last = levels[-1]
+        levels.append(np.minimum(last[:-step], last[step:]))
+    level = np.log2(right - left).astype(int)
+    result = np.empty(len(left), dtype=values.dtype)
+    for k in np.unique(level):
+        mask = level == k
+        table = levels[k]
+        result[mask] = np.minimum(table[left[mask]],
+                                  table[right[mask] - 2 ** k])
+    return result
@@ -12,6 +12,9 @@ class BeamStats(Device):
 
     mj_avg = Cpt(AvgSignal, 'mj', averages=120, kind='normal')
     mj_buffersize = Cpt(AttributeSignal, 'mj_avg.averages', kind='config')
+    mj_std = Cpt(AttributeSignal, 'mj_avg.std', kind='omitted')
+    mj_min = Cpt(AttributeSignal, 'mj_avg.minimum', kind='omitted')
+    mj_max = Cpt(AttributeSignal, 'mj_avg.maximum', kind='omitted')
 
     def __init__(self, prefix='', name='beam_stats', **kwargs):
         super().__init__(prefix=prefix, name=name, **kwargs)
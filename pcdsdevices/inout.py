@@ -5,12 +5,25 @@ The classes that are defined here can be used to create other devices that need
 methods such as ``insert`` or ``remove`` and the ability to mark discrete
 states as in the beam or out of the beam.
 """
+import logging
 import math
+from collections import namedtuple
+from functools import partial
+from threading import RLock
 
+from ophyd.pv_positioner import PVPositioner
+from ophyd.signal import Signal
 from ophyd.sim import NullStatus
 
 from .doc_stubs import basic_positioner_init, insert_remove
-from .state import StatePositioner, StateRecordPositioner, PVStatePositioner
+from .signal import PeriodicResum
+from .state import (StatePositioner, StateRecordPositioner, PVStatePositioner,
+                    move_states)
+
+logger = logging.getLogger(__name__)
+
+InsertionSnapshot = namedtuple('InsertionSnapshot',
+                               ['inserted', 'removed', 'transmission'])
 
 
 class InOutPositioner(StatePositioner):
@@ -54,20 +67,37 @@ class InOutPositioner(StatePositioner):
         self._trans_enum = {}
         self._extend_trans_enum(self.in_states, 0)
         self._extend_trans_enum(self.out_states, 1)
+        self._in_indices = self._state_indices(self.in_states)
+        self._out_indices = self._state_indices(self.out_states)
 
     @property
     def inserted(self):
         """
         True if the device is inserted
         """
-        return self._pos_in_list(self.in_states)
+        return self._state_index() in self._in_indices
 
     @property
     def removed(self):
         """
         True if the device is removed
         """
-        return self._pos_in_list(self.out_states)
+        return self._state_index() in self._out_indices
+
+    def insertion_snapshot(self):
+        """
+        Read the state once and report the insertion and transmission.
+
+        Returns
+        -------
+        snapshot: ``InsertionSnapshot``
+            Named tuple of the ``inserted``, ``removed`` and ``transmission``
+            values for the same reading of the state.
+        """
+        index = self._state_index()
+        return InsertionSnapshot(index in self._in_indices,
+                                 index in self._out_indices,
+                                 self._trans_enum.get(index, math.nan))
 
     def insert(self, moved_cb=None, timeout=None, wait=False):
         """
@@ -99,7 +129,13 @@ class InOutPositioner(StatePositioner):
         This will be a float between 0 and 1, where 0 is no beam and 1 is full
         transmission.
         """
-        state_index = self.get_state(self.position).value
+        return self._trans_enum.get(self._state_index(), math.nan)
+
+    def _state_transmission(self, state):
+        """
+        The transmission of any value that `get_state` accepts.
+        """
+        state_index = self.get_state(state).value
         return self._trans_enum.get(state_index, math.nan)
 
     def _extend_trans_enum(self, state_list, default):
@@ -107,12 +143,14 @@ class InOutPositioner(StatePositioner):
             index = self.states_list.index(state)
             self._trans_enum[index] = self._transmission.get(state, default)
 
-    def _pos_in_list(self, state_list):
-        current_state = self.get_state(self.position)
-        for state in state_list:
-            if current_state == self.get_state(state):
-                return True
-        return False
+    def _state_indices(self, state_list):
+        return frozenset(self.states_list.index(state) for state in state_list)
+
+    def _state_index(self):
+        """
+        Read the state and return its integer value.
+        """
+        return self.get_state(self.state.get()).value
 
 
 class InOutRecordPositioner(StateRecordPositioner, InOutPositioner):
@@ -158,3 +196,153 @@ class InOutPVStatePositioner(PVStatePositioner, InOutPositioner):
                              'adding signals and filling in the '
                              '_state_logic dict.'))
         super().__init__(*args, **kwargs)
+
+
+class TransmissionSignal(Signal):
+    """
+    Signal for the combined transmission of devices in series.
+
+    This subscribes to ``SUB_STATE`` on each device, or to the ``readback``
+    of a `PVPositioner` such as ``Attenuator``, and keeps a running
+    product of their transmissions. When one device changes, only its
+    factor is replaced. Devices at zero or ``NaN`` transmission are counted
+    separately, so they can be replaced without rescanning the others.
+
+    Parameters
+    ----------
+    devices: ``list``
+        Devices with a ``transmission`` attribute and a ``SUB_STATE``
+        subscription, such as `InOutPositioner` or ``Attenuator``.
+
+    name: ``str``
+        An identifying name for this signal.
+    """
+    def __init__(self, devices, *, name, **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.devices = list(devices)
+        self._lock = RLock()
+        self._factors = {}
+        self._product = 1.0
+        self._zeros = 0
+        self._nans = 0
+        self._drift = PeriodicResum(len(self.devices), self._resum)
+        with self._lock:
+            for device in self.devices:
+                self._factors[device] = 1.0
+                self._replace(device, self._read_factor(device))
+                self._watch(device)
+            self._publish()
+
+    def _watch(self, device):
+        """
+        Subscribe to whatever reports a device's transmission.
+        """
+        if isinstance(device, PVPositioner):
+            # The done PV behind an attenuator's SUB_STATE can update before
+            # the readback does, so follow the readback itself
+            device.readback.subscribe(partial(self._readback_changed, device),
+                                      run=False)
+        else:
+            device.subscribe(self._device_changed,
+                             event_type=device.SUB_STATE, run=False)
+
+    def _read_factor(self, device, value=None):
+        """
+        Get one device's transmission, from a state value if possible.
+        """
+        try:
+            if value is not None and hasattr(device, '_state_transmission'):
+                return float(device._state_transmission(value))
+            return float(device.transmission)
+        except Exception:
+            logger.debug('Could not get transmission of %s', device.name,
+                         exc_info=True)
+            return math.nan
+
+    def _replace(self, device, factor):
+        """
+        Swap one device's factor in the running product.
+        """
+        old = self._factors[device]
+        if math.isnan(old):
+            self._nans -= 1
+        elif old == 0:
+            self._zeros -= 1
+        else:
+            self._product /= old
+        if math.isnan(factor):
+            self._nans += 1
+        elif factor == 0:
+            self._zeros += 1
+        else:
+            self._product *= factor
+        self._factors[device] = factor
+        self._drift.tick()
+
+    def _resum(self):
+        self._product = 1.0
+        for value in self._factors.values():
+            if value and not math.isnan(value):
+                self._product *= value
+
+    def _combined(self):
+        if self._nans:
+            return math.nan
+        if self._zeros:
+            return 0.0
+        return self._product
+
+    def _publish(self):
+        value = self._combined()
+        old_value = self._readback
+        if (value != old_value
+                and not (math.isnan(value) and old_value is not None
+                         and math.isnan(old_value))):
+            super().put(value)
+
+    def _device_changed(self, *args, obj, value=None, **kwargs):
+        with self._lock:
+            self._replace(obj, self._read_factor(obj, value))
+            self._publish()
+
+    def _readback_changed(self, device, *args, value=None, **kwargs):
+        try:
+            factor = float(value)
+        except (TypeError, ValueError):
+            factor = self._read_factor(device)
+        with self._lock:
+            self._replace(device, factor)
+            self._publish()
+
+    def put(self, value, **kwargs):
+        raise NotImplementedError('TransmissionSignal is read-only')
+
+
+def remove_all(devices, timeout=None, wait=False):
+    """
+    Remove many `InOutPositioner` devices from the beam at once.
+
+    Devices that are already removed are left alone. The rest are moved to
+    the first state in their ``out_states`` list together, so clearing the
+    beam path takes as long as the slowest device.
+
+    Parameters
+    ----------
+    devices: ``list`` of `InOutPositioner`
+        The devices to remove.
+
+    timeout: ``float``, optional
+        Maximum time to wait for all of the devices.
+
+    wait: ``bool``, optional
+        If ``True``, do not return until every device is removed.
+
+    Returns
+    -------
+    status: `StateGroupStatus`
+        ``Status`` that represents the progress of the whole group.
+    """
+    to_remove = [device for device in devices if not device.removed]
+    return move_states(to_remove,
+                       [device.out_states[0] for device in to_remove],
+                       timeout=timeout, wait=wait)
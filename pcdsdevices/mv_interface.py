@@ -1,17 +1,25 @@
 """
 Module for defining bell-and-whistles movement features
 """
+import copy
 import time
+import asyncio
 import fcntl
+import json
 import logging
 import numbers
-import signal
+import os
+import uuid
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait as futures_wait
 from contextlib import contextmanager
 from pathlib import Path
-from threading import Thread, Event
-from types import SimpleNamespace, MethodType
+from threading import Event, Lock, RLock, local
+from types import MethodType
 from weakref import WeakSet
 
+import numpy as np
 import pylab
 import yaml
 from bluesky.utils import ProgressBar
@@ -21,6 +29,10 @@ from . import utils as util
 
 logger = logging.getLogger(__name__)
 
+WM_WORKERS = 16
+WmReading = namedtuple('WmReading',
+                       ['name', 'position', 'timestamp', 'latency', 'error'])
+
 
 class MvInterface:
     """
@@ -85,17 +97,14 @@ class MvInterface:
         Shows a live-updating motor position in the terminal.
 
         This will be the value that is returned by the ``position`` attribute.
-        This method ends cleanly at a ctrl+c or after a call to
-        `end_monitor_thread`, which may be useful when this is called in a
-        background thread.
+        The display is driven by the device's subscriptions, so it only
+        redraws when the position changes. This method ends cleanly at a
+        ctrl+c or after a call to `end_monitor_thread`, which may be useful
+        when this is called in a background thread.
         """
         try:
             self._mov_ev.clear()
-            while not self._mov_ev.is_set():
-                print("\r {0:4f}".format(self.position), end=" ")
-                self._mov_ev.wait(0.1)
-        except KeyboardInterrupt:
-            pass
+            camonitor(self, stop_event=self._mov_ev)
         finally:
             self._mov_ev.clear()
 
@@ -127,6 +136,26 @@ class FltMvInterface(MvInterface):
         super().__init__(*args, **kwargs)
         self.presets = Presets(self)
 
+    def __getattr__(self, name):
+        # Preset methods such as mv_sample are resolved on access
+        presets = self.__dict__.get('presets')
+        if presets is not None:
+            method = presets._device_method(name)
+            if method is not None:
+                return method
+        try:
+            getattr_ = super().__getattr__
+        except AttributeError:
+            raise AttributeError(name)
+        return getattr_(name)
+
+    def __dir__(self):
+        names = set(super().__dir__())
+        presets = self.__dict__.get('presets')
+        if presets is not None:
+            names.update(presets._device_method_names())
+        return sorted(names)
+
     def mvr(self, delta, timeout=None, wait=False):
         """
         Relative move from this position.
@@ -230,7 +259,8 @@ def setup_preset_paths(**paths):
     **paths: ``str`` keyword args
         A mapping from type of preset to destination path. These will be
         directories that contain the yaml files that define the preset
-        positions.
+        positions, or a single ``.yml`` file that holds the presets of every
+        device, keyed by device name.
     """
     Presets._paths = {}
     for k, v in paths.items():
@@ -239,6 +269,417 @@ def setup_preset_paths(**paths):
         preset.sync()
 
 
+class _PresetLoader(yaml.SafeLoader):
+    """
+    Safe YAML loader that also reads the numpy scalars in older preset files.
+
+    Preset files used to be written with ``yaml.dump``, which tags numpy
+    values with the Python objects that rebuild them. Only those tags are
+    understood here, and the values are read back as plain Python numbers,
+    so the next write of the file leaves them untagged.
+    """
+
+
+def _construct_numpy_dtype(loader, node):
+    if isinstance(node, yaml.SequenceNode):
+        args = loader.construct_sequence(node, deep=True)
+    else:
+        args = loader.construct_mapping(node, deep=True)['args']
+    return np.dtype(args[0])
+
+
+def _construct_numpy_scalar(loader, node):
+    dtype, data = loader.construct_sequence(node, deep=True)
+    return np.frombuffer(data, dtype=dtype)[0].item()
+
+
+_PresetLoader.add_constructor(
+    'tag:yaml.org,2002:python/tuple',
+    lambda loader, node: tuple(loader.construct_sequence(node, deep=True)))
+_PresetLoader.add_constructor(
+    'tag:yaml.org,2002:python/object/apply:numpy.dtype',
+    _construct_numpy_dtype)
+for _module in ('numpy.core.multiarray', 'numpy._core.multiarray'):
+    _PresetLoader.add_constructor(
+        'tag:yaml.org,2002:python/object/apply:{}.scalar'.format(_module),
+        _construct_numpy_scalar)
+
+
+class PresetStore:
+    """
+    In-memory cache of parsed preset files.
+
+    Each file is parsed once and kept until its inode, modification time,
+    change time or size changes, so repeated syncs of an unchanged file only
+    cost a ``stat``. A consolidated preset file shared by many devices is
+    parsed once for all of them.
+
+    File times are coarse on some filesystems, NFS in particular, so a file
+    rewritten at the same size soon after it was read can look unchanged.
+    Files that were cached within ``mtime_slack`` seconds of their last
+    modification are therefore also compared by a checksum of their contents
+    until they have been seen unchanged for longer than that.
+
+    Attributes
+    ----------
+    loads: ``int``
+        The number of times a file has been parsed.
+
+    mtime_slack: ``float``
+        The coarsest file time resolution to allow for, in seconds.
+    """
+    mtime_slack = 2.0
+
+    def __init__(self):
+        self._files = {}
+        self._lock = RLock()
+        self.loads = 0
+
+    def read(self, path, fd):
+        """
+        Return the parsed contents of an open preset file.
+
+        The returned ``dict`` is shared with the cache and must not be
+        modified.
+
+        Parameters
+        ----------
+        path: ``Path``
+            The path of the file, used as the cache key.
+
+        fd: ``file``
+            The open file, used to check whether it has changed.
+        """
+        key, settled = self._key(fd)
+        with self._lock:
+            try:
+                cached_key, checksum, data, cached_settled = \
+                    self._files[str(path)]
+            except KeyError:
+                pass
+            else:
+                if cached_key == key:
+                    if cached_settled:
+                        return data
+                    fd.seek(0)
+                    text = fd.read()
+                    if zlib.crc32(text.encode()) == checksum:
+                        self._files[str(path)] = (key, checksum, data,
+                                                  settled)
+                        return data
+            logger.debug('parse presets file %s', path)
+            fd.seek(0)
+            text = fd.read()
+            data = yaml.load(text, Loader=_PresetLoader) or {}
+            self.loads += 1
+            self._files[str(path)] = (key, zlib.crc32(text.encode()), data,
+                                      settled)
+            return data
+
+    def write(self, path, fd, data):
+        """
+        Overwrite an open preset file and update the cache to match.
+        """
+        with self._lock:
+            text = yaml.dump(data, default_flow_style=False)
+            fd.seek(0)
+            fd.write(text)
+            fd.truncate()
+            fd.flush()
+            key, settled = self._key(fd)
+            self._files[str(path)] = (key, zlib.crc32(text.encode()), data,
+                                      settled)
+
+    def clear(self):
+        """
+        Forget every cached file.
+        """
+        with self._lock:
+            self._files.clear()
+
+    def _key(self, fd):
+        """
+        The file's identity, and whether it is too old to change unseen.
+        """
+        stat = os.fstat(fd.fileno())
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns, stat.st_size)
+        settled = time.time() - stat.st_mtime > self.mtime_slack
+        return key, settled
+
+
+class PresetJournal:
+    """
+    Append-only JSON-lines log of preset history.
+
+    Every change to a preset adds one line to the journal, so the cost of a
+    write does not depend on how much history has built up. Journals are
+    indexed in memory by ``(device, preset)``; since the files only grow,
+    later reads parse just the lines added since the previous one. A
+    journal that shrinks or is replaced, as after `compact`, is re-indexed
+    from the start.
+    """
+    def __init__(self):
+        self._indices = {}
+        self._lock = RLock()
+
+    def append(self, path, record):
+        """
+        Add one record to the journal at ``path``.
+
+        Parameters
+        ----------
+        path: ``Path``
+            The journal file. It is created if needed.
+
+        record: ``dict``
+            Must include ``device``, ``preset``, ``time`` and ``entry``, the
+            text shown in the preset's history.
+        """
+        line = json.dumps(record, sort_keys=True) + '\n'
+        with self._lock:
+            new = not path.exists()
+            if new:
+                line = self._header() + line
+            with open(str(path), 'a') as f:
+                f.write(line)
+            if new:
+                try:
+                    path.chmod(0o666)
+                except OSError:
+                    logger.debug('could not chmod %s', path, exc_info=True)
+
+    def history(self, path, device, preset):
+        """
+        All records for one preset, oldest first.
+        """
+        with self._lock:
+            entries = self._index(path)['entries']
+            return list(entries.get((device, preset), ()))
+
+    def compact(self, path, device=None, keep=None, legacy=None):
+        """
+        Rewrite the journal at ``path``, trimming old records.
+
+        The new journal is written next to the old one and moved into place,
+        so readers never see a partial file.
+
+        Parameters
+        ----------
+        path: ``Path``
+            The journal file.
+
+        device: ``str``, optional
+            Only trim records for this device. Records for other devices
+            sharing the journal are kept as they are.
+
+        keep: ``int``, optional
+            Keep only this many of the newest records for each preset. If
+            omitted, every record is kept.
+
+        legacy: ``list`` of ``dict``, optional
+            Older records, e.g. from a YAML ``history`` section, to place
+            before the journal's own records.
+        """
+        with self._lock:
+            entries = {}
+            for record in legacy or ():
+                key = (record['device'], record['preset'])
+                entries.setdefault(key, []).append(record)
+            for key, records in self._index(path)['entries'].items():
+                entries.setdefault(key, []).extend(records)
+            lines = [self._header()]
+            for key, records in entries.items():
+                if keep is not None and device in (None, key[0]):
+                    records = records[-keep:] if keep > 0 else []
+                lines.extend(json.dumps(record, sort_keys=True) + '\n'
+                             for record in records)
+            tmp = path.with_name(path.name + '.tmp')
+            with open(str(tmp), 'w') as f:
+                f.writelines(lines)
+            try:
+                tmp.chmod(0o666)
+            except OSError:
+                logger.debug('could not chmod %s', tmp, exc_info=True)
+            os.replace(str(tmp), str(path))
+            self._indices.pop(str(path), None)
+
+    @staticmethod
+    def _header():
+        """
+        First line of a new journal, unique to that file.
+        """
+        return json.dumps({'journal': uuid.uuid4().hex}) + '\n'
+
+    def _index(self, path):
+        """
+        Bring the in-memory index of a journal up to date and return it.
+        """
+        try:
+            stat = os.stat(str(path))
+        except FileNotFoundError:
+            self._indices.pop(str(path), None)
+            return dict(inode=None, offset=0, head=b'', entries={})
+        with open(str(path), 'rb') as f:
+            # Inodes can be reused, so also check that the journal's unique
+            # header is the one that was indexed
+            head = f.readline()
+            index = self._indices.get(str(path))
+            if (index is None or index['inode'] != stat.st_ino
+                    or stat.st_size < index['offset']
+                    or not head.startswith(index['head'])):
+                index = dict(inode=stat.st_ino, offset=0, head=b'',
+                             entries={})
+                self._indices[str(path)] = index
+            if stat.st_size > index['offset']:
+                f.seek(index['offset'])
+                chunk = f.read(stat.st_size - index['offset'])
+                # Leave a partially written last line for the next read
+                end = chunk.rfind(b'\n') + 1
+                for line in chunk[:end].splitlines():
+                    try:
+                        record = json.loads(line.decode())
+                        if 'journal' in record:
+                            continue
+                        key = (record['device'], record['preset'])
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning('Skipping bad line in %s: %r', path,
+                                       line)
+                        continue
+                    index['entries'].setdefault(key, []).append(record)
+                index['offset'] += end
+                if head.endswith(b'\n'):
+                    index['head'] = head
+        return index
+
+
+class FileLockStats:
+    """
+    Counters for time spent waiting on preset file locks.
+
+    Attributes
+    ----------
+    acquired: ``int``
+        Number of locks taken.
+
+    contended: ``int``
+        Number of locks that were held elsewhere on the first attempt.
+
+    timeouts: ``int``
+        Number of locks that could not be taken in time.
+
+    total_wait: ``float``
+        Total seconds spent waiting for locks.
+
+    max_wait: ``float``
+        Longest wait for a single lock in seconds.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        Reset all of the counters.
+        """
+        with self._lock:
+            self.acquired = 0
+            self.contended = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record(self, wait, contended, acquired):
+        """
+        Add the outcome of one lock attempt.
+        """
+        with self._lock:
+            if acquired:
+                self.acquired += 1
+            else:
+                self.timeouts += 1
+            if contended:
+                self.contended += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self):
+        """
+        The current counters as a ``dict``.
+        """
+        with self._lock:
+            return dict(acquired=self.acquired, contended=self.contended,
+                        timeouts=self.timeouts, total_wait=self.total_wait,
+                        max_wait=self.max_wait)
+
+
+LOCK_POLL_MIN = 0.001
+LOCK_POLL_MAX = 0.05
+
+
+def _lock_attempts(fd, timeout, stats):
+    """
+    Try a non-blocking exclusive ``flock`` until it succeeds or times out.
+
+    Yields the time to sleep before each retry, so the same logic can back
+    both the blocking and the async lock functions.
+    """
+    start = time.monotonic()
+    delay = LOCK_POLL_MIN
+    contended = False
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            contended = True
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                if stats is not None:
+                    stats.record(time.monotonic() - start, contended, False)
+                raise
+            yield min(delay, remaining)
+            delay = min(delay * 2, LOCK_POLL_MAX)
+        else:
+            if stats is not None:
+                stats.record(time.monotonic() - start, contended, True)
+            return
+
+
+def acquire_file_lock(fd, timeout=1.0, stats=None):
+    """
+    Take an exclusive ``flock`` on an open file, waiting up to ``timeout``.
+
+    The lock is polled with exponential backoff rather than waited on with
+    a signal, so this may be called from any thread.
+
+    Parameters
+    ----------
+    fd: ``file``
+        The open file to lock.
+
+    timeout: ``float``, optional
+        Maximum time to wait in seconds.
+
+    stats: `FileLockStats`, optional
+        Record the wait here.
+
+    Raises
+    ------
+    BlockingIOError:
+        If we cannot acquire the file lock.
+    """
+    for delay in _lock_attempts(fd, timeout, stats):
+        time.sleep(delay)
+
+
+async def async_acquire_file_lock(fd, timeout=1.0, stats=None):
+    """
+    Coroutine version of `acquire_file_lock` that waits with
+    ``asyncio.sleep`` instead of blocking the event loop.
+    """
+    for delay in _lock_attempts(fd, timeout, stats):
+        await asyncio.sleep(delay)
+
+
 class Presets:
     """
     Manager for device preset positions.
@@ -246,9 +687,11 @@ class Presets:
     This provides methods for adding new presets, checking which presets are
     active, and related utilities.
 
-    It will install the ``mv_presetname`` and ``wm_presetname`` methods onto
-    the associated device, and the ``add_preset`` and ``add_preset_here``
-    methods onto itself.
+    It provides the ``mv_presetname``, ``umv_presetname`` and
+    ``wm_presetname`` methods on the associated device, and the
+    ``add_preset`` and ``add_preset_here`` methods on itself. These are
+    looked up from the loaded presets when accessed rather than installed
+    ahead of time, so syncing does not depend on the number of presets.
 
     Parameters
     ----------
@@ -258,17 +701,21 @@ class Presets:
 
     Attributes
     ----------
-    positions: ``SimpleNamespace``
+    positions: `PresetPositions`
         A namespace that contains all of the active presets as `PresetPosition`
         objects.
     """
     _registry = WeakSet()
     _paths = {}
+    _store = PresetStore()
+    _journal = PresetJournal()
+    lock_stats = FileLockStats()
 
     def __init__(self, device):
         self._device = device
-        self._methods = []
-        self._fd = None
+        self._active_index = None
+        self.positions = PresetPositions(self)
+        self._open_files = local()
         self._registry.add(self)
         self.name = device.name + '_presets'
         self.sync()
@@ -277,18 +724,39 @@ class Presets:
         """
         Utility function to get the preset file ``Path``.
         """
-        path = self._paths[preset_type] / (self._device.name + '.yml')
+        if self._consolidated(preset_type):
+            path = self._paths[preset_type]
+        else:
+            path = self._paths[preset_type] / (self._device.name + '.yml')
         logger.debug('select presets path %s', path)
         return path
 
+    def _history_path(self, preset_type):
+        """
+        Utility function to get the preset history journal ``Path``.
+        """
+        path = self._path(preset_type)
+        return path.with_name(path.stem + '_history.jsonl')
+
+    def _consolidated(self, preset_type):
+        """
+        True if this preset type keeps every device in one file.
+        """
+        return self._paths[preset_type].suffix in ('.yml', '.yaml')
+
     def _read(self, preset_type):
         """
         Utility function to get a particular preset's datum dictionary.
+
+        The result is shared with the `PresetStore` cache, so copy it before
+        making changes.
         """
         logger.debug('read presets for %s', self._device.name)
         with self._file_open_rlock(preset_type) as f:
-            f.seek(0)
-            return yaml.load(f) or {}
+            data = self._store.read(self._path(preset_type), f)
+            if self._consolidated(preset_type):
+                data = data.get(self._device.name) or {}
+            return data
 
     def _write(self, preset_type, data):
         """
@@ -296,9 +764,12 @@ class Presets:
         """
         logger.debug('write presets for %s', self._device.name)
         with self._file_open_rlock(preset_type) as f:
-            f.seek(0)
-            yaml.dump(data, f, default_flow_style=False)
-            f.truncate()
+            path = self._path(preset_type)
+            if self._consolidated(preset_type):
+                full_data = dict(self._store.read(path, f))
+                full_data[self._device.name] = data
+                data = full_data
+            self._store.write(path, f, data)
 
     @contextmanager
     def _file_open_rlock(self, preset_type, timeout=1.0):
@@ -306,58 +777,47 @@ class Presets:
         File locking context manager for this object.
 
         Works like threading.Rlock in that you can acquire it multiple times
-        safely.
+        safely from the same thread. Other threads and processes wait for
+        the lock using `acquire_file_lock`.
 
         Parameters
         ----------
-        fd: ``file``
-            The file descriptor to lock on.
+        preset_type: ``str``
+            The type of preset whose file to lock.
+
+        timeout: ``float``, optional
+            Maximum time to wait for the lock in seconds.
 
         Raises
         ------
         BlockingIOError:
             If we cannot acquire the file lock.
         """
-        if self._fd is None:
-            path = self._path(preset_type)
-            with open(path, 'r+') as fd:
-                # Set up file lock timeout with a raising handler
-                # We will need this handler due to PEP 475
-                def interrupt(signum, frame):
-                    raise InterruptedError()
-
-                old_handler = signal.signal(signal.SIGALRM, interrupt)
-                try:
-                    signal.setitimer(signal.ITIMER_REAL, timeout)
-                    fcntl.flock(fd, fcntl.LOCK_EX)
-                except InterruptedError:
-                    # Ignore interrupted and proceed to cleanup
-                    pass
-                finally:
-                    # Clean up file lock timeout
-                    signal.setitimer(signal.ITIMER_REAL, 0)
-                    signal.signal(signal.SIGALRM, old_handler)
-                # Error now if we still can't get the lock.
-                # Getting lock twice is safe.
-                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                logger.debug('acquired lock for %s', path)
-                self._fd = fd
+        open_files = self._open_files.__dict__
+        if preset_type in open_files:
+            logger.debug('using already open file descriptor')
+            yield open_files[preset_type]
+            return
+        path = self._path(preset_type)
+        with open(str(path), 'r+') as fd:
+            acquire_file_lock(fd, timeout=timeout, stats=self.lock_stats)
+            logger.debug('acquired lock for %s', path)
+            open_files[preset_type] = fd
+            try:
                 yield fd
+            finally:
+                del open_files[preset_type]
                 fcntl.flock(fd, fcntl.LOCK_UN)
                 logger.debug('released lock for %s', path)
-            self._fd = None
-        else:
-            logger.debug('using already open file descriptor')
-            yield self._fd
 
     def _update(self, preset_type, name, value=None, comment=None,
                 active=True):
         """
         Utility function to update a preset position.
 
-        Reads the existing preset's datum, updates the value the comment, and
-        the active state, and then writes the datum back to the file, updating
-        the history accordingly.
+        Reads the existing preset's datum, updates the value and the active
+        state, and then writes the datum back to the file. The new value and
+        comment are appended to the history journal.
         """
         logger.debug(('call %s presets._update(%s, %s, value=%s, comment=%s, '
                       'active=%s)'), self._device.name, preset_type, name,
@@ -374,35 +834,88 @@ class Presets:
                 path.touch()
                 path.chmod(0o666)
             with self._file_open_rlock(preset_type):
-                data = self._read(preset_type)
+                data = copy.deepcopy(self._read(preset_type))
+                record = None
                 if value is None and comment is not None:
                     value = data[name]['value']
                 if value is not None:
                     if name not in data:
                         data[name] = {}
-                    ts = time.strftime('%d %b %Y %H:%M:%S')
                     data[name]['value'] = value
-                    history = data[name].get('history', {})
                     if comment:
-                        comment = ' ' + comment
+                        entry = '{:10.4f} {}'.format(value, comment)
                     else:
-                        comment = ''
-                    history[ts] = '{:10.4f}{}'.format(value, comment)
-                    data[name]['history'] = history
+                        entry = '{:10.4f}'.format(value)
+                    record = dict(device=self._device.name, preset=name,
+                                  time=time.strftime('%d %b %Y %H:%M:%S'),
+                                  value=value, comment=comment or '',
+                                  entry=entry)
                 if active:
                     data[name]['active'] = True
                 else:
                     data[name]['active'] = False
                 self._write(preset_type, data)
+                if record is not None:
+                    self._journal.append(self._history_path(preset_type),
+                                         record)
         except BlockingIOError:
             self._log_flock_error()
 
+    def _history(self, preset_type, name):
+        """
+        Utility function to get a preset's history ``dict``.
+
+        Combines any ``history`` section left in the preset file by older
+        versions with the records in the history journal.
+        """
+        history = dict(self._cache[preset_type][name].get('history', {}))
+        for record in self._journal.history(self._history_path(preset_type),
+                                            self._device.name, name):
+            history[record['time']] = record['entry']
+        return history
+
+    def compact_history(self, keep=None):
+        """
+        Compact the history journals for this device.
+
+        Moves any ``history`` left in the preset files into the journals,
+        so that the preset files only hold the current values.
+
+        Parameters
+        ----------
+        keep: ``int``, optional
+            Keep only this many of the newest history entries for each
+            preset. If omitted, all history is kept.
+        """
+        logger.debug('call %s presets.compact_history(keep=%s)',
+                     self._device.name, keep)
+        for preset_type in self._paths.keys():
+            if not self._path(preset_type).exists():
+                continue
+            try:
+                with self._file_open_rlock(preset_type):
+                    data = copy.deepcopy(self._read(preset_type))
+                    legacy = []
+                    for name, info in data.items():
+                        for ts, entry in info.pop('history', {}).items():
+                            legacy.append(dict(device=self._device.name,
+                                               preset=name, time=ts,
+                                               entry=entry))
+                    self._journal.compact(self._history_path(preset_type),
+                                          device=self._device.name,
+                                          keep=keep, legacy=legacy)
+                    if legacy:
+                        self._write(preset_type, data)
+            except BlockingIOError:
+                self._log_flock_error()
+        self.sync()
+
     def sync(self):
         """
         Synchronize the presets with the database.
         """
         logger.debug('call %s presets.sync()', self._device.name)
-        self._remove_methods()
+        self._active_index = None
         self._cache = {}
         logger.debug('filling %s cache', self.name)
         for preset_type in self._paths.keys():
@@ -415,48 +928,70 @@ class Presets:
             else:
                 logger.debug('No %s preset file for %s',
                              preset_type, self._device.name)
-        self._create_methods()
 
     def _log_flock_error(self):
         logger.error(('Unable to acquire file lock for %s. '
                       'File may be being edited by another user.'), self.name)
         logger.debug('', exc_info=True)
 
-    def _create_methods(self):
+    def _active(self):
+        """
+        Map each active preset name to its preset type.
+
+        Built from the cache on first use after each `sync`.
+        """
+        index = self._active_index
+        if index is None:
+            index = {}
+            for preset_type, data in self._cache.items():
+                for name, info in data.items():
+                    if info['active']:
+                        index[name] = preset_type
+            self._active_index = index
+        return index
+
+    def __getattr__(self, name):
+        # add_preset_type and add_here_preset_type are resolved on access
+        for prefix in ('add_here_', 'add_'):
+            if name.startswith(prefix) and name[len(prefix):] in self._paths:
+                add, add_here = self._make_add(name[len(prefix):])
+                if prefix == 'add_here_':
+                    return MethodType(add_here, self)
+                return MethodType(add, self)
+        raise AttributeError(name)
+
+    def __dir__(self):
+        names = set(super().__dir__())
+        for preset_type in self._paths.keys():
+            names.add('add_' + preset_type)
+            names.add('add_here_' + preset_type)
+        return sorted(names)
+
+    def _device_method(self, attr):
         """
-        Create the dynamic methods based on the configured paths.
+        Create the device's ``mv``, ``umv`` or ``wm`` method named ``attr``.
 
-        Add methods to this object for adding presets of each type, add
-        methods to the associated device to move and check each preset, and
-        add `PresetPosition` instances to ``self.positions`` for each preset
-        name.
+        Returns ``None`` if ``attr`` does not name an active preset method.
         """
-        logger.debug('call %s presets._create_methods()', self._device.name)
-        for preset_type in self._paths.keys():
-            add, add_here = self._make_add(preset_type)
-            self._register_method(self, 'add_' + preset_type, add)
-            self._register_method(self, 'add_here_' + preset_type, add_here)
-        for preset_type, data in self._cache.items():
-            for name, info in data.items():
-                if info['active']:
-                    mv, umv = self._make_mv_pre(preset_type, name)
-                    wm = self._make_wm_pre(preset_type, name)
-                    self._register_method(self._device, 'mv_' + name, mv)
-                    self._register_method(self._device, 'umv_' + name, umv)
-                    self._register_method(self._device, 'wm_' + name, wm)
-                    setattr(self.positions, name,
-                            PresetPosition(self, preset_type, name))
-
-    def _register_method(self, obj, method_name, method):
-        """
-        Utility function for managing dynamic methods.
-
-        Adds a method to the ``_methods`` list and binds the method to an
-        object.
-        """
-        logger.debug('register method %s to %s', method_name, obj.name)
-        self._methods.append((obj, method_name))
-        setattr(obj, method_name, MethodType(method, obj))
+        prefix, _, name = attr.partition('_')
+        if prefix not in ('mv', 'umv', 'wm'):
+            return None
+        preset_type = self._active().get(name)
+        if preset_type is None:
+            return None
+        if prefix == 'wm':
+            method = self._make_wm_pre(preset_type, name)
+        else:
+            mv, umv = self._make_mv_pre(preset_type, name)
+            method = mv if prefix == 'mv' else umv
+        return MethodType(method, self._device)
+
+    def _device_method_names(self):
+        """
+        The names of every preset method available on the device.
+        """
+        return [prefix + name for name in self._active()
+                for prefix in ('mv_', 'umv_', 'wm_')]
 
     def _make_add(self, preset_type):
         """
@@ -569,18 +1104,32 @@ class Presets:
         wm_pre.__doc__ = wm_pre.__doc__.format(name)
         return wm_pre
 
-    def _remove_methods(self):
-        """
-        Remove all methods created in the last call to _create_methods.
-        """
-        logger.debug('call %s presets._remove_methods()', self._device.name)
-        for obj, method_name in self._methods:
-            try:
-                delattr(obj, method_name)
-            except AttributeError:
-                pass
-        self._methods = []
-        self.positions = SimpleNamespace()
+
+class PresetPositions:
+    """
+    Namespace of a device's active preset positions.
+
+    Each attribute is a `PresetPosition`, created when accessed.
+
+    Parameters
+    ----------
+    presets: `Presets`
+        The main `Presets` object that manages these positions.
+    """
+    def __init__(self, presets):
+        self._presets = presets
+
+    def __getattr__(self, name):
+        presets = self.__dict__.get('_presets')
+        if presets is None:
+            raise AttributeError(name)
+        preset_type = presets._active().get(name)
+        if preset_type is None:
+            raise AttributeError(name)
+        return PresetPosition(presets, preset_type, name)
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(self._presets._active()))
 
 
 class PresetPosition:
@@ -671,7 +1220,7 @@ class PresetPosition:
         -------
         history: ``dict``
         """
-        return self.info['history']
+        return self._presets._history(self._preset_type, self._name)
 
     @property
     def path(self):
@@ -688,6 +1237,169 @@ class PresetPosition:
         return str(self.pos)
 
 
+def wm_snapshot(devices, timeout=None, max_workers=WM_WORKERS):
+    """
+    Read the positions of many devices at once.
+
+    Each device's ``wm`` is called on a worker thread, so slow or
+    disconnected devices do not hold up the rest. Errors are recorded per
+    device instead of being raised.
+
+    Parameters
+    ----------
+    devices: iterable of `MvInterface`
+        The devices to read.
+
+    timeout: ``float``, optional
+        Maximum time to wait for all of the readings. Devices that have not
+        answered by then are reported as timed out. If omitted, wait for
+        every device.
+
+    max_workers: ``int``, optional
+        Maximum number of concurrent reads.
+
+    Returns
+    -------
+    readings: ``list`` of ``WmReading``
+        One named tuple per device, in the order given, with the ``name``,
+        ``position``, ``timestamp`` of the reading, ``latency`` of the read
+        in seconds and ``error`` message. ``position``, ``timestamp`` and
+        ``latency`` are ``None`` when the read failed.
+    """
+    devices = list(devices)
+    if not devices:
+        return []
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(devices)))
+    try:
+        futures = [executor.submit(_timed_wm, device) for device in devices]
+        futures_wait(futures, timeout=timeout)
+    finally:
+        executor.shutdown(wait=False)
+    readings = []
+    for device, future in zip(devices, futures):
+        if future.done():
+            readings.append(future.result())
+        else:
+            future.cancel()
+            readings.append(WmReading(device.name, None, None, None,
+                                      'Timed out after {}s'.format(timeout)))
+    return readings
+
+
+def _timed_wm(device):
+    start = time.monotonic()
+    try:
+        position = device.wm()
+    except Exception as exc:
+        logger.debug('wm failed for %s', device.name, exc_info=True)
+        return WmReading(device.name, None, None, None,
+                         '{}: {}'.format(type(exc).__name__, exc))
+    return WmReading(device.name, position, time.time(),
+                     time.monotonic() - start, None)
+
+
+def camonitor(*devices, interval=0.1, stop_event=None):
+    """
+    Shows live-updating positions of one or more devices in the terminal.
+
+    Each device's position is read once up front, then updated from its
+    subscriptions: ``SUB_STATE`` for a `StatePositioner`, and
+    ``SUB_READBACK`` for anything else, so an idle monitor makes no requests
+    of its own. The display is redrawn only after a change, and at most once
+    every ``interval`` seconds. With several devices a header
+    of device names is printed first, followed by a single updating row.
+
+    This ends cleanly at a ctrl+c or when ``stop_event`` is set.
+
+    Parameters
+    ----------
+    devices: positioners
+        The devices to monitor.
+
+    interval: ``float``, optional
+        Minimum time between redraws in seconds.
+
+    stop_event: ``threading.Event``, optional
+        Set this event from another thread to end the monitor.
+    """
+    # Avoid a circular import, state imports this module
+    from .state import StatePositioner
+
+    if not devices:
+        raise ValueError('camonitor needs at least one device')
+    if stop_event is None:
+        stop_event = Event()
+    changed = Event()
+    lock = Lock()
+    values = [_format_position(device.position) for device in devices]
+
+    def make_callback(index, device, is_state):
+        def update(*args, value=None, **kwargs):
+            if is_state:
+                text = _state_text(device, value)
+            else:
+                text = _format_position(device.position)
+            with lock:
+                values[index] = text
+            changed.set()
+        return update
+
+    if len(devices) == 1:
+        template = ' {}'
+    else:
+        widths = [max(len(device.name), 12) for device in devices]
+        template = ' '.join('{:>%d}' % width for width in widths)
+        print(template.format(*(device.name for device in devices)))
+
+    subs = []
+    try:
+        for index, device in enumerate(devices):
+            is_state = isinstance(device, StatePositioner)
+            if is_state:
+                event_type = device.SUB_STATE
+            else:
+                event_type = device.SUB_READBACK
+            cid = device.subscribe(make_callback(index, device, is_state),
+                                   event_type=event_type, run=False)
+            subs.append((device, cid))
+        changed.set()
+        last_render = 0
+        while not stop_event.is_set():
+            if not changed.wait(interval):
+                continue
+            delay = last_render + interval - time.monotonic()
+            if delay > 0 and stop_event.wait(delay):
+                break
+            changed.clear()
+            with lock:
+                row = list(values)
+            print('\r' + template.format(*row), end=' ')
+            last_render = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for device, cid in subs:
+            device.unsubscribe(cid)
+
+
+def _state_text(device, value):
+    """
+    Format a `StatePositioner` state value the way ``position`` would be.
+    """
+    try:
+        value = device._state_name(value)
+    except Exception:
+        logger.debug('Could not resolve state %s for %s', value,
+                     device.name, exc_info=True)
+    return _format_position(value)
+
+
+def _format_position(value):
+    if isinstance(value, numbers.Real) and not isinstance(value, bool):
+        return '{0:4f}'.format(value)
+    return str(value)
+
+
 def tweak_base(*args):
     """
     Base function to control motors with the arrow keys.
@@ -708,11 +1420,9 @@ def tweak_base(*args):
 
     def thread_event():
         """
-        Function call camonitor to display motor position.
+        Function used to display the motor position.
         """
-        thrd = Thread(target=args[0].camonitor,)
-        thrd.start()
-        args[0]._mov_ev.set()
+        print("\r {0:4f}".format(args[0].position), end=" ")
 
     def _scale(scale, direction):
         """
@@ -1,8 +1,16 @@
 """
 Module to define ophyd Signal subclass utilities.
 """
+import heapq
+import itertools
 import logging
-from threading import RLock, Thread
+import math
+import time
+import warnings
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, RLock, Thread, local
 
 import numpy as np
 from ophyd.signal import Signal
@@ -10,6 +18,310 @@ from ophyd.signal import Signal
 logger = logging.getLogger(__name__)
 
 
+class _AggregateDispatcher:
+    """
+    Shared background thread that runs delayed `AggregateSignal` updates.
+
+    One thread serves every coalescing `AggregateSignal` in the session. It
+    is started on first use.
+    """
+    def __init__(self):
+        self._cond = Condition()
+        self._queue = []
+        self._counter = itertools.count()
+        self._thread = None
+
+    def schedule(self, signal, delay):
+        """
+        Call ``signal._flush_pending()`` after ``delay`` seconds.
+        """
+        deadline = time.monotonic() + delay
+        with self._cond:
+            heapq.heappush(self._queue,
+                           (deadline, next(self._counter), signal))
+            if self._thread is None:
+                self._thread = Thread(target=self._run,
+                                      name='aggregate_dispatcher',
+                                      daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+                deadline, _, signal = self._queue[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                heapq.heappop(self._queue)
+            try:
+                signal._flush_pending()
+            except Exception:
+                logger.exception('Error updating %s', signal.name)
+
+
+_dispatcher = _AggregateDispatcher()
+
+
+class _ConnectionWaiter:
+    """
+    Shared background thread that runs callbacks once signals connect.
+
+    Signals that are already connected have their callback run immediately.
+    The rest are polled from one thread, started on first use, instead of
+    each blocking a thread of their own in ``wait_for_connection``. Once a
+    signal connects, its callback runs on a small shared pool, so that a
+    slow callback does not hold up the polling. A callback that returns
+    ``False`` is not finished, and is run again after ``poll_interval``
+    seconds. These retries are kept apart from the signals that have not
+    connected yet. Each retry can wait longer than the last, and the
+    callback is dropped with a warning after a set number of retries.
+
+    Signals and bound method callbacks are held by weak reference, so that
+    waiting on a signal that never connects does not keep it alive. A
+    waiting callback is dropped once either is garbage collected, or when
+    its ``timeout`` passes.
+    """
+    poll_interval = 0.1
+    workers = 4
+
+    def __init__(self):
+        self._cond = Condition()
+        # List of (signal_ref, callback_ref, options, deadline)
+        self._pending = []
+        # Heap of (due, counter, signal_ref, callback_ref, options, attempt)
+        self._retry = []
+        self._counter = itertools.count()
+        self._thread = None
+        self._executor = None
+
+    def add(self, signal, callback, max_retries=None, backoff=1,
+            timeout=None):
+        """
+        Call ``callback()`` as soon as ``signal`` is connected.
+
+        If the callback returns ``False``, the wait before each retry is
+        ``backoff`` times the last one, and the callback is dropped after
+        ``max_retries`` retries. ``None`` retries forever. If the signal has
+        not connected after ``timeout`` seconds, the callback is dropped
+        with a warning. ``None`` waits forever.
+        """
+        options = (max_retries, backoff)
+        if signal.connected:
+            if callback() is not False:
+                return
+            self._schedule_retry(signal, callback, options, 1)
+            return
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        with self._cond:
+            self._pending.append((weakref.ref(signal), _callback_ref(callback),
+                                  options, deadline))
+            self._start()
+            self._cond.notify()
+
+    def _start(self):
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix='connection_callback')
+            self._thread = Thread(target=self._run,
+                                  name='connection_waiter',
+                                  daemon=True)
+            self._thread.start()
+
+    @property
+    def pending(self):
+        """
+        The number of signals that have not connected yet.
+        """
+        with self._cond:
+            return sum(1 for item in self._pending if item[0]() is not None)
+
+    @property
+    def retrying(self):
+        """
+        The number of connected signals waiting to rerun their callback.
+        """
+        with self._cond:
+            return len(self._retry)
+
+    def _schedule_retry(self, signal, callback, options, attempt):
+        max_retries, backoff = options
+        if max_retries is not None and attempt > max_retries:
+            logger.warning('Gave up on the connection callback for %s after '
+                           '%d retries', signal.name, max_retries)
+            return
+        delay = self.poll_interval * backoff ** (attempt - 1)
+        with self._cond:
+            heapq.heappush(self._retry,
+                           (time.monotonic() + delay, next(self._counter),
+                            weakref.ref(signal), _callback_ref(callback),
+                            options, attempt))
+            self._start()
+            self._cond.notify()
+
+    def _call(self, signal, callback, options, attempt=0):
+        try:
+            if callback() is False:
+                self._schedule_retry(signal, callback, options, attempt + 1)
+        except Exception:
+            logger.exception('Error in connection callback for %s',
+                             signal.name)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._retry:
+                    self._cond.wait()
+                pending = list(self._pending)
+                due = []
+                now = time.monotonic()
+                while self._retry and self._retry[0][0] <= now:
+                    signal_ref, callback_ref, options, attempt = \
+                        heapq.heappop(self._retry)[2:]
+                    signal, callback = signal_ref(), callback_ref()
+                    if signal is not None and callback is not None:
+                        due.append((signal, callback, options, attempt))
+            ready = []
+            done = set()
+            for item in pending:
+                signal_ref, callback_ref, options, deadline = item
+                signal, callback = signal_ref(), callback_ref()
+                if signal is None or callback is None:
+                    done.add(id(item))
+                    continue
+                try:
+                    if signal.connected:
+                        ready.append((signal, callback, options))
+                        done.add(id(item))
+                    elif deadline is not None and now >= deadline:
+                        logger.warning('Gave up waiting for %s to connect',
+                                       signal.name)
+                        done.add(id(item))
+                except Exception:
+                    logger.debug('Error checking connection of %s',
+                                 signal.name, exc_info=True)
+            with self._cond:
+                self._pending = [item for item in self._pending
+                                 if id(item) not in done]
+            try:
+                for item in ready + due:
+                    self._executor.submit(self._call, *item)
+            except RuntimeError:
+                # The interpreter is shutting down
+                return
+            # Drop our strong references before waiting again
+            ready = due = item = signal = callback = None
+            with self._cond:
+                timeout = None
+                if self._pending:
+                    timeout = self.poll_interval
+                if self._retry:
+                    remaining = max(self._retry[0][0] - time.monotonic(), 0)
+                    if timeout is None or remaining < timeout:
+                        timeout = remaining
+                if timeout is not None:
+                    self._cond.wait(timeout)
+
+
+def _callback_ref(callback):
+    """
+    Weak reference to a bound method, or a plain reference to any callable.
+    """
+    if hasattr(callback, '__self__') and hasattr(callback, '__func__'):
+        return weakref.WeakMethod(callback)
+    return lambda: callback
+
+
+_connection_waiter = _ConnectionWaiter()
+
+
+def run_when_connected(signal, callback, max_retries=None, backoff=1,
+                       timeout=None):
+    """
+    Call ``callback()`` once ``signal`` is connected, without blocking.
+
+    If the signal is already connected, the callback runs immediately.
+    Otherwise, one background thread shared by all waiting signals watches
+    for the connection, and the callback runs on a small shared pool. If the
+    callback returns ``False``, it is called again later, e.g. to wait for
+    metadata that arrives after the connection.
+
+    Parameters
+    ----------
+    signal: ``Signal``
+        The signal to wait for.
+
+    callback: ``callable``
+        Function to call with no arguments.
+
+    max_retries: ``int``, optional
+        Give up with a warning after the callback has returned ``False``
+        this many more times. By default, retry forever.
+
+    backoff: ``float``, optional
+        Multiply the wait between retries by this much after each retry.
+
+    timeout: ``float``, optional
+        Give up with a warning if the signal has not connected after this
+        many seconds. By default, wait as long as the signal exists.
+
+    Notes
+    -----
+    The signal, and the callback if it is a bound method, are only weakly
+    referenced while waiting. If either is garbage collected first, the
+    callback is dropped.
+    """
+    _connection_waiter.add(signal, callback, max_retries=max_retries,
+                           backoff=backoff, timeout=timeout)
+
+
+def pending_connections():
+    """
+    Count the signals still waiting to connect before they can be monitored.
+
+    Signals that have connected but whose callback asked to be run again,
+    e.g. to wait for metadata, are not counted.
+
+    Returns
+    -------
+    pending: ``int``
+    """
+    return _connection_waiter.pending
+
+
+# Shared pool for parallel sub-signal gets, created on first use
+_get_executor = None
+_get_executor_lock = RLock()
+_get_worker = local()
+GET_WORKERS = 8
+
+
+def _submit_get(func, *args):
+    """
+    Run ``func(*args)`` on the shared sub-signal get pool.
+    """
+    global _get_executor
+    if _get_executor is None:
+        with _get_executor_lock:
+            if _get_executor is None:
+                _get_executor = ThreadPoolExecutor(
+                    max_workers=GET_WORKERS,
+                    thread_name_prefix='aggregate_get')
+    return _get_executor.submit(_run_get_worker, func, *args)
+
+
+def _run_get_worker(func, *args):
+    _get_worker.active = True
+    return func(*args)
+
+
 class AggregateSignal(Signal):
     """
     Signal that is composed of a number of other signals.
@@ -24,8 +336,27 @@ class AggregateSignal(Signal):
 
     _sub_signals: list
         Signals that contribute to this signal.
+
+    _coalesce_window: float or None
+        If set, sub-signal updates are collected for this many seconds and
+        applied together in one recalculation on a shared dispatcher thread,
+        emitting at most one ``SUB_VALUE`` per window. If ``None``, the
+        default, every sub-signal update is processed immediately.
+
+    _snapshot_max_age: float or None
+        Once every sub-signal is monitored, `get` returns the last computed
+        readback without any network access, as long as it was computed less
+        than this many seconds ago. Older readbacks are refreshed in full.
+        If ``None``, the default, every `get` reads the sub-signals.
+
+    _parallel_get: bool
+        If ``True``, a full refresh in `get` reads all the sub-signals at the
+        same time on a shared thread pool instead of one after another.
     """
     _update_only_on_change = True
+    _coalesce_window = None
+    _snapshot_max_age = None
+    _parallel_get = False
 
     def __init__(self, *, name, **kwargs):
         super().__init__(name=name, **kwargs)
@@ -33,6 +364,13 @@ class AggregateSignal(Signal):
         self._has_subscribed = False
         self._lock = RLock()
         self._sub_signals = []
+        self._pending = {}
+        self._flush_scheduled = False
+        self._dropped_updates = 0
+        self._merged_updates = 0
+        # (readback, time.monotonic()) swapped in whole on each recalculation
+        self._snapshot = None
+        self._get_latency = {}
 
     def _calc_readback(self):
         """
@@ -61,17 +399,59 @@ class AggregateSignal(Signal):
         """
         with self._lock:
             self._readback = self._calc_readback()
+            self._snapshot = (self._readback, time.monotonic())
 
     def get(self, **kwargs):
         """
         Update all values and recalculate
+
+        If every sub-signal is monitored, this instead returns the last
+        readback, unless it is older than ``_snapshot_max_age`` or there are
+        coalesced updates waiting to be applied.
         """
+        snapshot = self._snapshot
+        if (self._has_subscribed and snapshot is not None and not kwargs
+                and not self._pending and self._snapshot_max_age is not None
+                and time.monotonic() - snapshot[1] < self._snapshot_max_age):
+            return snapshot[0]
         with self._lock:
-            for signal in self._sub_signals:
-                self._cache[signal] = signal.get(**kwargs)
+            # Nested parallel gets on a pool thread could starve the pool
+            if (self._parallel_get and len(self._sub_signals) > 1
+                    and not getattr(_get_worker, 'active', False)):
+                futures = [_submit_get(self._timed_get, signal, kwargs)
+                           for signal in self._sub_signals]
+                values = [future.result() for future in futures]
+            else:
+                values = [self._timed_get(signal, kwargs)
+                          for signal in self._sub_signals]
+            for signal, value in zip(self._sub_signals, values):
+                self._cache[signal] = value
+            # Held updates are older than the values we just read
+            self._pending.clear()
             self._update_state()
             return self._readback
 
+    def _timed_get(self, signal, kwargs):
+        """
+        Get one sub-signal's value and record how long it took.
+        """
+        start = time.monotonic()
+        value = signal.get(**kwargs)
+        self._get_latency[signal.name] = time.monotonic() - start
+        return value
+
+    @property
+    def get_latency(self):
+        """
+        Duration of the most recent read of each sub-signal.
+
+        Returns
+        -------
+        latency: ``dict``
+            Mapping from sub-signal name to seconds.
+        """
+        return dict(self._get_latency)
+
     def put(self, value, **kwargs):
         raise NotImplementedError('put should be overriden in the subclass')
 
@@ -87,13 +467,33 @@ class AggregateSignal(Signal):
             for signal in self._sub_signals:
                 signal.subscribe(self._run_sub_value, run=False)
             self.get()  # Ensure we have a full cache
+            self._has_subscribed = True
         return cid
 
+    @property
+    def coalesce_stats(self):
+        """
+        Counters for the updates absorbed by the coalescing mode.
+
+        Returns
+        -------
+        stats: ``dict``
+            ``dropped`` counts sub-signal values that were replaced by a newer
+            value from the same signal within one window. ``merged`` counts
+            updates that were folded into an already pending recalculation.
+        """
+        with self._lock:
+            return dict(dropped=self._dropped_updates,
+                        merged=self._merged_updates)
+
     def _run_sub_value(self, *args, **kwargs):
         kwargs.pop('sub_type')
         sig = kwargs.pop('obj')
         kwargs.pop('old_value')
         value = kwargs['value']
+        if self._coalesce_window is not None:
+            self._defer_value(sig, value)
+            return
         with self._lock:
             old_value = self._readback
             # Update just one value and assume the rest are cached
@@ -103,6 +503,579 @@ class AggregateSignal(Signal):
                 self._run_subs(sub_type=self.SUB_VALUE, obj=self, value=value,
                                old_value=old_value)
 
+    def _defer_value(self, signal, value):
+        """
+        Hold one sub-signal update until the end of the coalescing window.
+        """
+        with self._lock:
+            if signal in self._pending:
+                self._dropped_updates += 1
+            elif self._pending:
+                self._merged_updates += 1
+            self._pending[signal] = value
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                _dispatcher.schedule(self, self._coalesce_window)
+
+    def _flush_pending(self):
+        """
+        Apply all held sub-signal updates and recalculate once.
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._flush_scheduled = False
+            if not pending:
+                return
+            old_value = self._readback
+            self._cache.update(pending)
+            self._update_state()
+            value = self._readback
+            if value != old_value or not self._update_only_on_change:
+                self._run_subs(sub_type=self.SUB_VALUE, obj=self, value=value,
+                               old_value=old_value)
+
+
+def _push_monotonic(queue, keys, values, func):
+    """
+    Append a batch of samples to a monotonic queue of ``(key, value)``.
+
+    ``func`` is ``np.minimum`` for a queue of increasing values, whose head
+    is the minimum, or ``np.maximum`` for the reverse. Only samples that beat
+    every later sample in the batch can reach the head, and these are found
+    with one reversed accumulation instead of pushing samples one by one.
+    ``NaN`` samples are skipped.
+    """
+    finite = ~np.isnan(values)
+    keys, values = keys[finite], values[finite]
+    if not len(values):
+        return
+    better = np.less if func is np.minimum else np.greater
+    # Best of each sample and everything after it
+    best = func.accumulate(values[::-1])[::-1]
+    keep = np.ones(len(values), dtype=bool)
+    keep[:-1] = better(values[:-1], best[1:])
+    # The first kept sample is the best of the batch
+    first = values[keep][0]
+    while queue and not better(queue[-1][1], first):
+        queue.pop()
+    queue.extend(zip(keys[keep].tolist(), values[keep].tolist()))
+
+
+class PeriodicResum:
+    """
+    Recompute running totals from scratch every ``period`` updates.
+
+    Running sums that are updated by adding and subtracting samples pick up
+    floating point drift. Accumulators count their updates with `tick`, and
+    ``resum`` is called to rebuild the totals exactly once per ``period``
+    updates, which keeps the amortized cost per update constant.
+
+    Parameters
+    ----------
+    period: ``int``
+        The number of updates between recalculations.
+
+    resum: ``callable``
+        Function that rebuilds the totals, called with no arguments.
+    """
+    def __init__(self, period, resum):
+        self.period = period
+        self._resum = resum
+        self._ops = 0
+
+    def tick(self, ops=1):
+        """
+        Count ``ops`` updates, recalculating if a period has passed.
+        """
+        self._ops += ops
+        if self._ops >= self.period:
+            self._ops = 0
+            self._resum()
+
+
+class _RollingStats:
+    """
+    Ring buffer of samples with running statistics.
+
+    Adding a sample updates the count, mean, variance, minimum and maximum of
+    the samples in the buffer in amortized constant time, regardless of the
+    buffer size. ``NaN`` samples take up a slot in the buffer but are left out
+    of the statistics.
+
+    Parameters
+    ----------
+    size: ``int``
+        The number of samples to keep.
+    """
+    def __init__(self, size):
+        self.values = np.empty(size)
+        self.values.fill(np.nan)
+        self.index = 0
+        self._seq = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._count = 0
+        # Monotonic queues of (seq, value) for the sliding min and max
+        self._min = deque()
+        self._max = deque()
+        self._drift = PeriodicResum(size, self._resum)
+
+    def add(self, value, timestamp=None):
+        """
+        Add one sample, replacing the oldest sample if the buffer is full.
+        """
+        size = len(self.values)
+        old = self.values[self.index]
+        if not math.isnan(old):
+            self._sum -= old
+            self._sumsq -= old * old
+            self._count -= 1
+        self.values[self.index] = value
+        # Read back to get the float conversion, e.g. None becomes NaN
+        value = self.values[self.index]
+        self.index = (self.index + 1) % size
+        seq = self._seq
+        self._seq += 1
+        if not math.isnan(value):
+            self._sum += value
+            self._sumsq += value * value
+            self._count += 1
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((seq, value))
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((seq, value))
+        oldest = self._seq - size
+        while self._min and self._min[0][0] < oldest:
+            self._min.popleft()
+        while self._max and self._max[0][0] < oldest:
+            self._max.popleft()
+        self._drift.tick()
+
+    def extend(self, values, timestamp=None):
+        """
+        Add an array of samples with vectorized copies and sums.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        size = len(self.values)
+        count = len(values)
+        if not count:
+            return
+        seqs = np.arange(self._seq, self._seq + count)
+        self._seq += count
+        if count >= size:
+            # Only the newest samples fit, in order
+            values = values[-size:]
+            self.values[:] = values
+            self.index = 0
+            self._drift.tick(count)
+            self._min.clear()
+            self._max.clear()
+            _push_monotonic(self._min, seqs[-size:], values, np.minimum)
+            _push_monotonic(self._max, seqs[-size:], values, np.maximum)
+            return
+        start = self.index
+        indices = np.arange(start, start + count) % size
+        old = self.values[indices]
+        old = old[~np.isnan(old)]
+        self._sum -= float(np.sum(old))
+        self._sumsq -= float(np.sum(old * old))
+        self._count -= len(old)
+        self.values[indices] = values
+        new = values[~np.isnan(values)]
+        self._sum += float(np.sum(new))
+        self._sumsq += float(np.sum(new * new))
+        self._count += len(new)
+        self.index = (start + count) % size
+        self._drift.tick(count)
+        _push_monotonic(self._min, seqs, values, np.minimum)
+        _push_monotonic(self._max, seqs, values, np.maximum)
+        oldest = self._seq - size
+        while self._min and self._min[0][0] < oldest:
+            self._min.popleft()
+        while self._max and self._max[0][0] < oldest:
+            self._max.popleft()
+
+    def _resum(self):
+        finite = self.values[~np.isnan(self.values)]
+        self._sum = float(np.sum(finite))
+        self._sumsq = float(np.sum(finite * finite))
+        self._count = len(finite)
+
+    def samples(self):
+        """
+        All samples in the buffer, oldest first.
+        """
+        return np.concatenate((self.values[self.index:],
+                               self.values[:self.index]))
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def mean(self):
+        if not self._count:
+            return math.nan
+        return self._sum / self._count
+
+    @property
+    def variance(self):
+        if not self._count:
+            return math.nan
+        mean = self._sum / self._count
+        return max(self._sumsq / self._count - mean * mean, 0.0)
+
+    @property
+    def minimum(self):
+        if not self._min:
+            return math.nan
+        return self._min[0][1]
+
+    @property
+    def maximum(self):
+        if not self._max:
+            return math.nan
+        return self._max[0][1]
+
+
+class _TimeWindowStats(_RollingStats):
+    """
+    Samples from the last ``duration`` seconds with running statistics.
+
+    Samples and their timestamps are kept in a circular array that doubles in
+    size when full, so both adding and evicting samples are amortized
+    constant time. Timestamps must not decrease, so the samples to evict are
+    found by binary search.
+
+    Parameters
+    ----------
+    duration: ``float``
+        The length of the window in seconds.
+    """
+    def __init__(self, duration, capacity=16):
+        self.duration = duration
+        self._values = np.empty(capacity)
+        self._times = np.empty(capacity)
+        self._head = 0
+        self._len = 0
+        self._drift = PeriodicResum(capacity, self._resum)
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._count = 0
+        # Monotonic queues of (timestamp, value) for the sliding min and max
+        self._min = deque()
+        self._max = deque()
+
+    def add(self, value, timestamp=None):
+        """
+        Add one sample and drop every sample that is now out of the window.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        value = float(np.nan if value is None else value)
+        self._evict(timestamp - self.duration)
+        if self._len == len(self._values):
+            self._grow(self._len + 1)
+        capacity = len(self._values)
+        index = (self._head + self._len) % capacity
+        self._values[index] = value
+        self._times[index] = timestamp
+        self._len += 1
+        if not math.isnan(value):
+            self._sum += value
+            self._sumsq += value * value
+            self._count += 1
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((timestamp, value))
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((timestamp, value))
+        self._drift.tick()
+
+    def extend(self, values, timestamp=None):
+        """
+        Add an array of samples that share one timestamp, with vectorized
+        copies and sums.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        values = np.asarray(values, dtype=float).ravel()
+        count = len(values)
+        if not count:
+            return
+        self._evict(timestamp - self.duration)
+        if self._len + count > len(self._values):
+            self._grow(self._len + count)
+        capacity = len(self._values)
+        indices = (self._head + self._len + np.arange(count)) % capacity
+        self._values[indices] = values
+        self._times[indices] = timestamp
+        self._len += count
+        new = values[~np.isnan(values)]
+        self._sum += float(np.sum(new))
+        self._sumsq += float(np.sum(new * new))
+        self._count += len(new)
+        times = np.full(count, float(timestamp))
+        _push_monotonic(self._min, times, values, np.minimum)
+        _push_monotonic(self._max, times, values, np.maximum)
+        self._drift.tick(count)
+
+    def _evict(self, cutoff):
+        if self._len and self._times[self._head] < cutoff:
+            capacity = len(self._values)
+            end = self._head + self._len
+            # The window wraps around the end of the array at most once
+            first = self._times[self._head:min(end, capacity)]
+            drop = int(np.searchsorted(first, cutoff, side='left'))
+            if drop == len(first) and end > capacity:
+                drop += int(np.searchsorted(self._times[:end - capacity],
+                                            cutoff, side='left'))
+            indices = (self._head + np.arange(drop)) % capacity
+            old = self._values[indices]
+            old = old[~np.isnan(old)]
+            self._sum -= float(np.sum(old))
+            self._sumsq -= float(np.sum(old * old))
+            self._count -= len(old)
+            self._head = (self._head + drop) % capacity
+            self._len -= drop
+            self._drift.tick(drop)
+        while self._min and self._min[0][0] < cutoff:
+            self._min.popleft()
+        while self._max and self._max[0][0] < cutoff:
+            self._max.popleft()
+
+    def _grow(self, needed):
+        capacity = len(self._values)
+        while capacity < needed:
+            capacity *= 2
+        values = self.samples()
+        times = np.concatenate((self._times[self._head:],
+                                self._times[:self._head]))[:self._len]
+        self._values = np.empty(capacity)
+        self._times = np.empty(capacity)
+        self._values[:self._len] = values
+        self._times[:self._len] = times
+        self._head = 0
+        self._drift.period = capacity
+
+    def samples(self):
+        """
+        All samples in the window, oldest first.
+        """
+        end = self._head + self._len
+        if end <= len(self._values):
+            return self._values[self._head:end].copy()
+        return np.concatenate((self._values[self._head:],
+                               self._values[:end - len(self._values)]))
+
+    @property
+    def values(self):
+        return self.samples()
+
+
+class _EmaStats:
+    """
+    Exponential moving average and variance in constant memory.
+
+    Parameters
+    ----------
+    span: ``int``
+        The number of samples the average spans, giving a smoothing factor of
+        ``2 / (span + 1)``.
+    """
+    minimum = math.nan
+    maximum = math.nan
+
+    def __init__(self, span):
+        self.span = span
+        self.count = 0
+        self.mean = math.nan
+        self.variance = math.nan
+
+    @property
+    def span(self):
+        return self._span
+
+    @span.setter
+    def span(self, span):
+        self._span = span
+        self._alpha = 2 / (span + 1)
+
+    def add(self, value, timestamp=None):
+        """
+        Fold one sample into the average, skipping ``NaN``.
+        """
+        if value is None or math.isnan(value):
+            return
+        if not self.count:
+            self.mean = float(value)
+            self.variance = 0.0
+        else:
+            diff = value - self.mean
+            incr = self._alpha * diff
+            self.mean += incr
+            self.variance = (1 - self._alpha) * (self.variance + diff * incr)
+        self.count += 1
+
+    def extend(self, values, timestamp=None):
+        """
+        Fold an array of samples into the average, in order.
+
+        This gives the same result as calling `add` for each sample, using
+        the closed form of the recurrence: after ``k`` samples, the mean is
+        the old mean weighted by ``(1 - alpha)**k`` plus each sample ``x_j``
+        weighted by ``alpha * (1 - alpha)**(k - j)``.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        if not self.count:
+            self.add(values[0])
+            values = values[1:]
+        alpha = self._alpha
+        beta = 1 - alpha
+        if beta <= 0:
+            # Each sample replaces the average outright
+            if len(values):
+                self.mean = float(values[-1])
+                self.variance = 0.0
+                self.count += len(values)
+            return
+        # The weights grow as beta**-j within a chunk, keep them in range
+        chunk = max(1, int(math.log(1e-12) / math.log(beta)))
+        for start in range(0, len(values), chunk):
+            part = values[start:start + chunk]
+            powers = beta ** np.arange(1, len(part) + 1)
+            # Mean after each sample of the chunk
+            means = powers * (self.mean
+                              + alpha * np.cumsum(part / powers))
+            before = np.concatenate(([self.mean], means[:-1]))
+            diff = part - before
+            self.variance = float(
+                powers[-1] * self.variance
+                + alpha * np.sum(powers[-1] / powers * beta * diff * diff))
+            self.mean = float(means[-1])
+        self.count += len(values)
+
+    def samples(self):
+        """
+        No samples are stored, so this is always empty.
+        """
+        return np.empty(0)
+
+    values = property(samples)
+
+
+class _WaveformStats:
+    """
+    Element-wise running statistics over the last ``size`` waveforms.
+
+    Each sample is a whole waveform of fixed length, stored as one row of a
+    ring buffer. The statistics are arrays with one entry per element.
+
+    Parameters
+    ----------
+    size: ``int``
+        The number of waveforms to keep.
+
+    length: ``int``, optional
+        The number of elements per waveform. If omitted, this is taken from
+        the first waveform.
+    """
+    def __init__(self, size, length=None):
+        self.size = size
+        self.length = None
+        self.values = None
+        self.index = 0
+        if length is not None:
+            self._allocate(length)
+
+    def _allocate(self, length):
+        self.length = length
+        self.values = np.empty((self.size, length))
+        self.values.fill(np.nan)
+        self._sum = np.zeros(length)
+        self._sumsq = np.zeros(length)
+        self._count = np.zeros(length, dtype=int)
+        self._drift = PeriodicResum(self.size, self._resum)
+
+    def add(self, value, timestamp=None):
+        """
+        Add one waveform, replacing the oldest if the buffer is full.
+        """
+        wave = np.asarray(value, dtype=float).ravel()
+        if self.values is None:
+            self._allocate(len(wave))
+        elif len(wave) != self.length:
+            raise ValueError('Expected a waveform of length {}, got {}'
+                             ''.format(self.length, len(wave)))
+        old = self.values[self.index]
+        mask = ~np.isnan(old)
+        self._sum -= np.where(mask, old, 0)
+        self._sumsq -= np.where(mask, old * old, 0)
+        self._count -= mask
+        self.values[self.index] = wave
+        mask = ~np.isnan(wave)
+        self._sum += np.where(mask, wave, 0)
+        self._sumsq += np.where(mask, wave * wave, 0)
+        self._count += mask
+        self.index = (self.index + 1) % self.size
+        self._drift.tick()
+
+    def _resum(self):
+        mask = ~np.isnan(self.values)
+        finite = np.where(mask, self.values, 0)
+        self._sum = np.sum(finite, axis=0)
+        self._sumsq = np.sum(finite * finite, axis=0)
+        self._count = np.sum(mask, axis=0)
+
+    def samples(self):
+        """
+        All waveforms in the buffer, oldest first.
+        """
+        if self.values is None:
+            return np.empty((0, 0))
+        return np.concatenate((self.values[self.index:],
+                               self.values[:self.index]))
+
+    def _per_element(self, func, *args):
+        if self.values is None:
+            return math.nan
+        with warnings.catch_warnings(), np.errstate(divide='ignore',
+                                                    invalid='ignore'):
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return func(*args)
+
+    @property
+    def count(self):
+        if self.values is None:
+            return 0
+        return self._count.copy()
+
+    @property
+    def mean(self):
+        return self._per_element(np.divide, self._sum, self._count)
+
+    @property
+    def variance(self):
+        def variance():
+            mean = self._sum / self._count
+            return np.maximum(self._sumsq / self._count - mean * mean, 0)
+        return self._per_element(variance)
+
+    @property
+    def minimum(self):
+        return self._per_element(np.nanmin, self.values, 0)
+
+    @property
+    def maximum(self):
+        return self._per_element(np.nanmax, self.values, 0)
+
 
 class AvgSignal(Signal):
     """
@@ -125,21 +1098,60 @@ class AvgSignal(Signal):
 
     averages: ``int``
         The number of SUB_VALUE updates to include in the average. New values
-        after this number is reached will begin overriding old values.
+        after this number is reached will begin overriding old values. In
+        ``'ema'`` mode, this is the span of the exponential average.
+
+    mode: ``str``, optional
+        ``'count'`` (default) averages the last `averages` updates.
+        ``'time'`` averages the updates from the last `duration` seconds.
+        ``'ema'`` keeps an exponential moving average in constant memory.
+
+    duration: ``float``, optional
+        The length of the window in seconds. Required for ``'time'`` mode.
+
+    array_mode: ``str``, optional
+        How to handle array-valued signals. By default each update is a
+        single sample. ``'samples'`` treats each update as an array of
+        consecutive samples, which are added to the buffer together.
+        ``'waveform'`` treats each update as one fixed-length waveform and
+        averages element-wise, making the value and statistics arrays. The
+        ``'waveform'`` option is only available in ``'count'`` mode.
+
+    The mean is kept up to date in constant time per update. The same window
+    also provides the `std`, `variance`, `minimum`, `maximum` and `count`
+    statistics, which can be exposed as sibling signals using an
+    ``AttributeSignal`` such as ``AttributeSignal('avg.std')``. The
+    ``'ema'`` mode does not track `minimum` and `maximum`.
     """
-    def __init__(self, signal, averages, *, name, parent=None, **kwargs):
+    modes = ('count', 'time', 'ema')
+    array_modes = (None, 'samples', 'waveform')
+
+    def __init__(self, signal, averages, *, name, parent=None, mode='count',
+                 duration=None, array_mode=None, **kwargs):
         super().__init__(name=name, parent=parent, **kwargs)
         if isinstance(signal, str):
             signal = getattr(parent, signal)
+        if mode not in self.modes:
+            raise ValueError('mode must be one of {}, not {}'
+                             ''.format(self.modes, mode))
+        if array_mode not in self.array_modes:
+            raise ValueError('array_mode must be one of {}, not {}'
+                             ''.format(self.array_modes, array_mode))
+        if mode == 'time' and duration is None:
+            raise ValueError("duration is required for mode='time'")
+        if array_mode == 'waveform' and mode != 'count':
+            raise ValueError("array_mode='waveform' requires mode='count'")
         self.raw_sig = signal
         self._lock = RLock()
+        self._mode = mode
+        self._duration = duration
+        self._array_mode = array_mode
+        self._stats = None
         self.averages = averages
         self._con = False
-        t = Thread(target=self._init_subs, args=())
-        t.start()
+        run_when_connected(self.raw_sig, self._init_subs)
 
     def _init_subs(self):
-        self.raw_sig.wait_for_connection()
         self.raw_sig.subscribe(self._update_avg)
         self._con = True
 
@@ -157,24 +1169,136 @@ class AvgSignal(Signal):
     @averages.setter
     def averages(self, avg):
         """
-        Reinitialize an empty internal buffer of size ``avg``.
+        Resize the internal buffer to ``avg``, keeping the newest values.
         """
         with self._lock:
             self._avg = avg
-            self.index = 0
-            # Allocate uninitalized array
-            self.values = np.empty(avg)
-            # Fill with nan
-            self.values.fill(np.nan)
+            if self._array_mode == 'waveform':
+                stats = _WaveformStats(avg)
+                if self._stats is not None:
+                    for wave in self._stats.samples()[-avg:]:
+                        stats.add(wave)
+                self._stats = stats
+            elif self._mode == 'count':
+                stats = _RollingStats(avg)
+                if self._stats is not None:
+                    for value in self._stats.samples()[-avg:]:
+                        stats.add(value)
+                self._stats = stats
+            elif self._mode == 'ema':
+                if self._stats is None:
+                    self._stats = _EmaStats(avg)
+                else:
+                    self._stats.span = avg
+            elif self._stats is None:
+                self._stats = _TimeWindowStats(self._duration)
+
+    @property
+    def mode(self):
+        """
+        The averaging mode, one of ``'count'``, ``'time'`` or ``'ema'``.
+        """
+        return self._mode
+
+    @property
+    def duration(self):
+        """
+        The length in seconds of the ``'time'`` mode window.
+        """
+        return self._duration
+
+    @duration.setter
+    def duration(self, duration):
+        """
+        Change the ``'time'`` mode window, keeping the values that fit.
+        """
+        with self._lock:
+            self._duration = duration
+            if self._mode == 'time':
+                self._stats.duration = duration
+
+    def clear(self):
+        """
+        Throw away all of the accumulated values.
+        """
+        with self._lock:
+            if self._array_mode == 'waveform':
+                self._stats = _WaveformStats(self._avg)
+            elif self._mode == 'count':
+                self._stats = _RollingStats(self._avg)
+            elif self._mode == 'ema':
+                self._stats = _EmaStats(self._avg)
+            else:
+                self._stats = _TimeWindowStats(self._duration)
+
+    @property
+    def values(self):
+        """
+        The internal buffer of values. In ``'count'`` mode this is the ring
+        buffer with ``NaN`` in unfilled slots, in ``'time'`` mode it is the
+        current window oldest first, and in ``'ema'`` mode it is empty. With
+        ``array_mode='waveform'`` the ring buffer has one row per waveform.
+        """
+        return self._stats.values
+
+    @property
+    def index(self):
+        """
+        The position in `values` that the next update will overwrite, in
+        ``'count'`` mode.
+        """
+        return getattr(self._stats, 'index', 0)
+
+    @property
+    def count(self):
+        """
+        The number of non-``NaN`` values in the buffer.
+        """
+        return self._stats.count
+
+    @property
+    def mean(self):
+        """
+        The mean of the buffered values, skipping ``NaN``.
+        """
+        return self._stats.mean
+
+    @property
+    def variance(self):
+        """
+        The population variance of the buffered values, skipping ``NaN``.
+        """
+        return self._stats.variance
+
+    @property
+    def std(self):
+        """
+        The population standard deviation of the buffered values.
+        """
+        return np.sqrt(self._stats.variance)
+
+    @property
+    def minimum(self):
+        """
+        The smallest buffered value, skipping ``NaN``.
+        """
+        return self._stats.minimum
+
+    @property
+    def maximum(self):
+        """
+        The largest buffered value, skipping ``NaN``.
+        """
+        return self._stats.maximum
 
     def _update_avg(self, *args, value, **kwargs):
         """
         Add new value to the buffer, overriding old values if needed.
         """
+        timestamp = kwargs.get('timestamp')
         with self._lock:
-            self.values[self.index] = value
-            self.index += 1
-            if self.index == len(self.values):
-                self.index = 0
-            # This takes a mean, skipping nan values.
-            self.put(np.nanmean(self.values))
+            if self._array_mode == 'samples':
+                self._stats.extend(value, timestamp)
+            else:
+                self._stats.add(value, timestamp)
+            self.put(self._stats.mean)
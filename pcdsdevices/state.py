@@ -3,19 +3,31 @@ Module to define positioners that move between discrete named states.
 """
 import logging
 import functools
+import itertools
+import time
 from enum import Enum
+from threading import Event, RLock
+from types import MappingProxyType
 
 from ophyd.positioner import PositionerBase
-from ophyd.status import wait as status_wait, SubscriptionStatus
+from ophyd.status import wait as status_wait, StatusBase, SubscriptionStatus
 from ophyd.signal import EpicsSignal, EpicsSignalRO
 from ophyd.device import Device, Component as Cpt, FormattedComponent as FCpt
 
 from .doc_stubs import basic_positioner_init
 from .mv_interface import MvInterface
-from .signal import AggregateSignal
+from .signal import AggregateSignal, run_when_connected
 
 logger = logging.getLogger(__name__)
 
+# Shared state definitions, so identical classes resolve through one table
+_states_enum_cache = {}
+_state_lookup_cache = {}
+# Compiled PVStatePositioner state logic, keyed by class
+_state_logic_tables = {}
+# Largest number of value combinations we are willing to precompute
+MAX_STATE_TABLE_SIZE = 4096
+
 
 class StatePositioner(Device, PositionerBase, MvInterface):
     """
@@ -64,6 +76,22 @@ class StatePositioner(Device, PositionerBase, MvInterface):
 
     egu = 'state'
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Build the lookup table now if the states are known at definition
+        if cls.states_list and 'states_enum' not in cls.__dict__:
+            states_list = cls.states_list
+            if cls._unknown:
+                states_list = [cls._unknown] + states_list
+            try:
+                states_enum = _make_states_enum(cls.__name__ + 'States',
+                                                states_list,
+                                                cls._states_alias)
+            except ValueError:
+                # Let the instance raise the error on init
+                return
+            _state_lookup(states_enum)
+
     def __init__(self, prefix, *, name, **kwargs):
         if self.__class__ is StatePositioner:
             raise TypeError(('StatePositioner must be subclassed with at '
@@ -144,8 +172,9 @@ class StatePositioner(Device, PositionerBase, MvInterface):
         if moved_cb is not None:
             status.add_callback(functools.partial(moved_cb, obj=self))
 
+        start = time.time()
         self._do_move(state)
-        self._run_subs(sub_type=self.SUB_START)
+        self._run_subs(sub_type=self.SUB_START, timestamp=start)
         return status
 
     def subscribe(self, cb, event_type=None, run=True):
@@ -168,8 +197,14 @@ class StatePositioner(Device, PositionerBase, MvInterface):
         Name of the positioner's current state. If aliases were provided, the
         first alias will be used instead of the base name.
         """
-        state = self.state.get()
-        state = self.get_state(state).name
+        return self._state_name(self.state.get())
+
+    def _state_name(self, value):
+        """
+        Return the display name for a raw ``state`` value, preferring the
+        first alias if one was provided.
+        """
+        state = self.get_state(value).name
         try:
             alias = self._states_alias[state]
             if isinstance(alias, list):
@@ -205,6 +240,11 @@ class StatePositioner(Device, PositionerBase, MvInterface):
             The corresponding ``Enum`` entry for this value. It has two
             meaningful fields, ``name`` and ``value``.
         """
+        # Fast path: precomputed table of ints, digit strings, names, aliases
+        try:
+            return _state_lookup(self.states_enum)[value]
+        except (KeyError, TypeError):
+            pass
         # Check for a malformed string digit
         if isinstance(value, str) and value.isdigit():
             value = int(value)
@@ -239,30 +279,86 @@ class StatePositioner(Device, PositionerBase, MvInterface):
         Create an enum that can be used to keep track of aliases, state names,
         and integer enum values.
         """
-        state_def = {}
-        state_count = 0
-        for i, state in enumerate(self.states_list):
-            # Skipped None states indicate a missing enum integer
-            if state is None:
-                continue
-            state_count += 1
-            state_def[state] = i
-            try:
-                aliases = self._states_alias[state]
-            except KeyError:
-                continue
-            if isinstance(aliases, str):
-                state_def[aliases] = i
-            else:
-                for alias in aliases:
-                    state_def[alias] = i
-        enum_name = self.__class__.__name__ + 'States'
-        enum = Enum(enum_name, state_def, start=0)
-        if len(enum) != state_count:
-            raise ValueError(('Bad states definition! Inconsistency in '
-                              'states_list {} or _states_alias {}'
-                              ''.format(self.states_list, self._states_alias)))
-        return enum
+        return _make_states_enum(self.__class__.__name__ + 'States',
+                                 self.states_list, self._states_alias)
+
+
+def _make_states_enum(enum_name, states_list, states_alias):
+    """
+    Create a states enum, reusing a cached one for identical definitions.
+
+    Parameters
+    ----------
+    enum_name: ``str``
+        The name of the ``Enum`` class to create.
+
+    states_list: ``list of str``
+        All states, in integer order. ``None`` entries are skipped.
+
+    states_alias: ``dict``
+        Mapping of state names to an alias or a list of aliases.
+
+    Returns
+    -------
+    states_enum: ``Enum``
+    """
+    alias_key = tuple(sorted(
+        (state, (aliases,) if isinstance(aliases, str) else tuple(aliases))
+        for state, aliases in states_alias.items()))
+    key = (enum_name, tuple(states_list), alias_key)
+    try:
+        return _states_enum_cache[key]
+    except KeyError:
+        pass
+    state_def = {}
+    state_count = 0
+    for i, state in enumerate(states_list):
+        # Skipped None states indicate a missing enum integer
+        if state is None:
+            continue
+        state_count += 1
+        state_def[state] = i
+        try:
+            aliases = states_alias[state]
+        except KeyError:
+            continue
+        if isinstance(aliases, str):
+            state_def[aliases] = i
+        else:
+            for alias in aliases:
+                state_def[alias] = i
+    enum = Enum(enum_name, state_def, start=0)
+    if len(enum) != state_count:
+        raise ValueError(('Bad states definition! Inconsistency in '
+                          'states_list {} or _states_alias {}'
+                          ''.format(states_list, states_alias)))
+    _states_enum_cache[key] = enum
+    return enum
+
+
+def _state_lookup(states_enum):
+    """
+    Get the immutable lookup table for a states enum.
+
+    The table maps every accepted input of `StatePositioner.get_state` to its
+    ``Enum`` entry: the entries themselves, their names and aliases, their
+    integer values, and the string forms of those integers.
+    """
+    try:
+        return _state_lookup_cache[states_enum]
+    except KeyError:
+        pass
+    table = {}
+    for name, state in states_enum.__members__.items():
+        table[name] = state
+    # Digit strings are resolved as integers, so they override names
+    for state in states_enum:
+        table[state] = state
+        table[state.value] = state
+        table[str(state.value)] = state
+    table = MappingProxyType(table)
+    _state_lookup_cache[states_enum] = table
+    return table
 
 
 class PVStateSignal(AggregateSignal):
@@ -271,6 +367,9 @@ class PVStateSignal(AggregateSignal):
 
     See `AggregateSignal` for more information.
     """
+    # Positions are read often, and the sub-signals are usually monitored
+    _snapshot_max_age = 5.0
+
     def __init__(self, *, name, **kwargs):
         super().__init__(name=name, **kwargs)
         self._sub_map = {}
@@ -292,32 +391,44 @@ class PVStateSignal(AggregateSignal):
         return {self.name: desc}
 
     def _calc_readback(self):
-        state_value = None
-        for signal_name, info in self.parent._state_logic.items():
-            # Get last cached value
-            value = self._cache[self._sub_map[signal_name]]
+        values = tuple(self._cache[sig] for sig in self._sub_signals)
+        return self._lookup_readback(values)
+
+    def _lookup_readback(self, values):
+        """
+        Find the state for one tuple of sub-signal values.
+        """
+        table = self.parent._compile_state_logic()
+        if table is not None:
             try:
-                signal_state = info[value]
-            # Handle unaccounted readbacks
-            except KeyError:
-                state_value = self.parent._unknown
-                break
-            # Associate readback with device state
-            if signal_state != 'defer':
-                if state_value:
-                    # Handle inconsistent readbacks
-                    if signal_state != state_value:
-                        state_value = self.parent._unknown
-                        break
-                else:
-                    # Set state to first non-deferred value
-                    state_value = signal_state
-                    if self.parent._state_logic_mode == 'ALL':
-                        continue
-                    elif self.parent._state_logic_mode == 'FIRST':
-                        break
-        # If all states deferred, report as unknown
-        return state_value or self.parent._unknown
+                return table[values]
+            except (KeyError, TypeError):
+                # Unlisted values can still settle on an earlier signal in
+                # FIRST mode, and arrays are unhashable
+                pass
+        return _evaluate_state_logic(self.parent._state_logic,
+                                     self.parent._state_logic_mode,
+                                     self.parent._unknown, values)
+
+    def calc_readbacks(self, values):
+        """
+        Find the states for many tuples of sub-signal values at once.
+
+        This is useful for replaying archived data through the state logic
+        without touching the live signals.
+
+        Parameters
+        ----------
+        values: ``iterable`` of ``tuple``
+            Each entry has one value per sub-signal, in the order of the
+            keys in the parent's ``_state_logic``.
+
+        Returns
+        -------
+        states: ``list`` of ``str``
+            The state name for each entry.
+        """
+        return [self._lookup_readback(tuple(row)) for row in values]
 
     def put(self, value, **kwargs):
         self.parent.move(value, **kwargs)
@@ -379,11 +490,96 @@ class PVStatePositioner(StatePositioner):
                             self.states_list.append(state_name)
         super().__init__(prefix, name=name, **kwargs)
 
+    @classmethod
+    def _compile_state_logic(cls):
+        """
+        Precompute the state for every combination of known signal values.
+
+        The result is cached per class and maps tuples of sub-signal values,
+        in ``_state_logic`` order, to state names. Combinations that are not
+        in the table, e.g. with unlisted values, are evaluated directly.
+
+        Returns
+        -------
+        table: ``MappingProxyType`` or ``None``
+            ``None`` if there are more than ``MAX_STATE_TABLE_SIZE``
+            combinations, in which case the logic is evaluated each time.
+        """
+        try:
+            return _state_logic_tables[cls]
+        except KeyError:
+            pass
+        keys = [list(info.keys()) for info in cls._state_logic.values()]
+        size = 1
+        for key in keys:
+            size *= len(key)
+        if size > MAX_STATE_TABLE_SIZE:
+            logger.debug('%s has %s state logic combinations, not compiling',
+                         cls.__name__, size)
+            table = None
+        else:
+            table = {}
+            for values in itertools.product(*keys):
+                table[values] = _evaluate_state_logic(cls._state_logic,
+                                                      cls._state_logic_mode,
+                                                      cls._unknown, values)
+            table = MappingProxyType(table)
+        _state_logic_tables[cls] = table
+        return table
+
     def _do_move(self, state):
         raise NotImplementedError(('Class must implement a _do_move method or '
                                    'override the move and set methods'))
 
 
+def _evaluate_state_logic(state_logic, mode, unknown, values):
+    """
+    Apply `PVStatePositioner` state logic to one tuple of signal values.
+
+    Parameters
+    ----------
+    state_logic: ``dict``
+        The ``_state_logic`` of a `PVStatePositioner`.
+
+    mode: ``str``, ``'ALL'`` or ``'FIRST'``
+        The ``_state_logic_mode`` of a `PVStatePositioner`.
+
+    unknown: ``str``
+        The name of the unknown state.
+
+    values: ``tuple``
+        One value per signal, in ``state_logic`` order.
+
+    Returns
+    -------
+    state: ``str``
+    """
+    state_value = None
+    for info, value in zip(state_logic.values(), values):
+        try:
+            signal_state = info[value]
+        # Handle unaccounted readbacks
+        except KeyError:
+            state_value = unknown
+            break
+        # Associate readback with device state
+        if signal_state != 'defer':
+            if state_value:
+                # Handle inconsistent readbacks
+                if signal_state != state_value:
+                    state_value = unknown
+                    break
+            else:
+                # Set state to first non-deferred value
+                state_value = signal_state
+                if mode == 'ALL':
+                    continue
+                elif mode == 'FIRST':
+                    break
+    # If all states deferred, report as unknown
+    return state_value or unknown
+
+
 class StateRecordPositioner(StatePositioner):
     """
     A `StatePositioner` for an EPICS states record.
@@ -395,12 +591,22 @@ class StateRecordPositioner(StatePositioner):
     readback = FCpt(EpicsSignalRO, '{self.prefix}:{self._readback}',
                     kind='normal')
 
+    # Checks for enum strings that arrive after the connection, at 0.1 s,
+    # then twice as long each time, for about 25 s in total
+    _enum_retries = 8
+    _enum_backoff = 2
+
     def __init__(self, prefix, *, name, **kwargs):
         some_state = self.states_list[0]
         self._readback = '{}_CALC.A'.format(some_state)
         super().__init__(prefix, name=name, **kwargs)
         self._has_subscribed_readback = False
         self._has_checked_state_enum = False
+        self._enum_polled = False
+        self._enum_lock = RLock()
+        self._states_ready = Event()
+        self._warm_up_started = False
+        self.warm_up()
 
     def subscribe(self, cb, event_type=None, run=True):
         cid = super().subscribe(cb, event_type=event_type, run=run)
@@ -415,17 +621,153 @@ class StateRecordPositioner(StatePositioner):
         kwargs.pop('obj')
         self._run_subs(sub_type=self.SUB_READBACK, obj=self, **kwargs)
 
-    def get_state(self, value):
-        if not self._has_checked_state_enum:
+    def warm_up(self):
+        """
+        Start building the states enum as soon as the state PV connects.
+
+        This returns immediately. The enum is built in a connection callback
+        that is shared with every other waiting device, so it is safe to call
+        this for many devices at once. The calling thread only reads the
+        metadata that the signal already has. If the enum strings are not
+        there yet, they are requested from the IOC on the shared callback
+        pool, retrying with a growing delay before giving up with a
+        warning. Metadata updates still complete the enum after that. Use
+        `wait_for_states` to wait for the result. This is called
+        automatically on init.
+        """
+        with self._enum_lock:
+            if self._warm_up_started:
+                return
+            self._warm_up_started = True
+        sub_meta = getattr(self.state, 'SUB_META', None)
+        if sub_meta is not None:
+            self.state.subscribe(self._state_meta_changed,
+                                 event_type=sub_meta, run=False)
+        run_when_connected(self.state, self._poll_state_enum,
+                           max_retries=self._enum_retries,
+                           backoff=self._enum_backoff)
+
+    def wait_for_states(self, timeout=None):
+        """
+        Wait until the states enum includes the PV's enum strings.
+
+        Parameters
+        ----------
+        timeout: ``float``, optional
+            Maximum time to wait in seconds. Wait forever if omitted.
+
+        Returns
+        -------
+        ready: ``bool``
+            ``True`` if the states enum is ready.
+        """
+        self.warm_up()
+        return self._states_ready.wait(timeout)
+
+    @property
+    def states_ready(self):
+        """
+        ``True`` if the states enum includes the PV's enum strings.
+        """
+        return self._states_ready.is_set()
+
+    def _state_meta_changed(self, *args, enum_strs=None, **kwargs):
+        if enum_strs:
+            self._check_state_enum(enum_strs)
+
+    def _poll_state_enum(self):
+        """
+        Connection callback that looks for the PV's enum strings.
+
+        The first check can run inline in ``__init__``, so it only looks at
+        the metadata that the signal already has. Retries run on the shared
+        connection callback pool and fall back to asking the IOC through
+        ``enum_strs``, since older ``ophyd`` versions never fill in this
+        metadata on their own.
+
+        Returns ``False`` if the enum strings are not available yet, so that
+        the connection callback is run again later.
+        """
+        if self._has_checked_state_enum:
+            return True
+        first, self._enum_polled = not self._enum_polled, True
+        enum_strs = _cached_enum_strs(self.state)
+        if not enum_strs and not first:
+            enum_strs = getattr(self.state, 'enum_strs', None)
+        if not enum_strs:
+            logger.debug('No enum strings yet for %s', self.name)
+            return False
+        return self._check_state_enum(enum_strs)
+
+    def _check_state_enum(self, enum_strs):
+        """
+        Add the PV's enum strings as aliases and rebuild the states enum.
+        """
+        with self._enum_lock:
+            if self._has_checked_state_enum:
+                return True
+            # Copy so that we don't modify the class's alias dict
+            states_alias = dict(self._states_alias)
             # Add the real enum as the first alias
-            for enum_val, state in zip(self.state.enum_strs, self.states_list):
-                aliases = self._states_alias.get(state, [])
+            for enum_val, state in zip(enum_strs, self.states_list):
+                aliases = states_alias.get(state, [])
                 if isinstance(aliases, str):
                     aliases = [aliases]
-                self._states_alias[state] = [enum_val] + aliases
+                states_alias[state] = [enum_val] + aliases
+            self._states_alias = states_alias
             self.states_enum = self._create_states_enum()
             self._has_checked_state_enum = True
-        return super().get_state(value)
+            self._states_ready.set()
+            return True
+
+
+def _cached_enum_strs(signal):
+    """
+    Get the enum strings that ``signal`` has already received.
+
+    Unlike ``signal.enum_strs``, this never asks the IOC, so it does not
+    block. Returns ``None`` if they have not arrived yet.
+    """
+    metadata = getattr(signal, '_metadata', None)
+    if metadata is not None:
+        return metadata.get('enum_strs')
+    # Older ophyd, pyepics keeps the control values it has received
+    pv = getattr(signal, '_read_pv', None)
+    if pv is not None:
+        return pv._args.get('enum_strs')
+    return None
+
+
+def warm_up_states(devices, timeout=None):
+    """
+    Build the states enums of many `StateRecordPositioner` at once.
+
+    Parameters
+    ----------
+    devices: ``list`` of `StateRecordPositioner`
+        The devices to warm up.
+
+    timeout: ``float``, optional
+        Maximum total time to wait in seconds. Wait forever if omitted.
+
+    Returns
+    -------
+    not_ready: ``list`` of `StateRecordPositioner`
+        The devices that were not ready before the timeout.
+    """
+    for device in devices:
+        device.warm_up()
+    if timeout is not None:
+        deadline = time.monotonic() + timeout
+    not_ready = []
+    for device in devices:
+        if timeout is None:
+            remaining = None
+        else:
+            remaining = max(deadline - time.monotonic(), 0)
+        if not device.wait_for_states(remaining):
+            not_ready.append(device)
+    return not_ready
 
 
 class StateStatus(SubscriptionStatus):
@@ -455,11 +797,16 @@ class StateStatus(SubscriptionStatus):
     """
     def __init__(self, device, desired_state,
                  timeout=None, settle_time=None):
+        # Resolve the goal once, and keep every raw value that matches it
+        self._desired = device.get_state(desired_state)
+        self._accepted_values = _accepted_values(device, self._desired)
+
         # Make a quick check_state callable
         def check_state(*, value, **kwargs):
-            value = device.get_state(value)
-            desired = device.get_state(desired_state)
-            return value == desired
+            self._desired, self._accepted_values = _current_target(
+                device, self._desired, self._accepted_values)
+            return _matches_state(device, self._desired,
+                                  self._accepted_values, value)
 
         # Start timeout and subscriptions
         super().__init__(device, check_state, event_type=device.SUB_STATE,
@@ -468,3 +815,182 @@ class StateStatus(SubscriptionStatus):
     def _finished(self, success=True, **kwargs):
         self.device._done_moving(success=success)
         super()._finished(success=success, **kwargs)
+
+
+class StateGroupStatus(StatusBase):
+    """
+    ``Status`` for moving many `StatePositioner` devices at once.
+
+    Every target is checked with ``check_value`` before any device moves.
+    All of the moves are then requested together and one shared callback
+    watches every device's state. The status finishes when the last device
+    arrives, and it is only successful if every device arrived.
+
+    Parameters
+    ----------
+    devices: ``list`` of `StatePositioner`
+        The devices to move. Each device may only appear once.
+
+    states: ``list`` of ``str`` or ``int``
+        The target state of each device, in the same order.
+
+    timeout: ``float``, optional
+        The time to wait for all of the devices before failing.
+
+    settle_time: ``float``, optional
+        Time to wait after completion until running callbacks.
+
+    Attributes
+    ----------
+    timing: ``dict``
+        Mapping from device name to the seconds it took to arrive.
+
+    failures: ``dict``
+        Mapping from device name to the reason that it did not arrive.
+    """
+    def __init__(self, devices, states, timeout=None, settle_time=None):
+        devices = list(devices)
+        states = list(states)
+        if len(devices) != len(states):
+            raise ValueError('Got {} devices but {} states'
+                             ''.format(len(devices), len(states)))
+        if len(set(devices)) != len(devices):
+            raise ValueError('Each device may only be moved once')
+        # Check everything before anything moves
+        targets = [device.check_value(state)
+                   for device, state in zip(devices, states)]
+        self.devices = devices
+        self.timing = {}
+        self.failures = {}
+        self._pending = {}
+        self._start = time.monotonic()
+        super().__init__(timeout=timeout, settle_time=settle_time)
+        with self._lock:
+            for device, target in zip(devices, targets):
+                self._pending[device] = (target,
+                                         _accepted_values(device, target))
+                device.subscribe(self._state_changed,
+                                 event_type=device.SUB_STATE, run=False)
+            for device, target in zip(devices, targets):
+                logger.debug('group move %s to %s', device.name, target.name)
+                try:
+                    start = time.time()
+                    device._do_move(target)
+                    device._run_subs(sub_type=device.SUB_START,
+                                     timestamp=start)
+                except Exception as exc:
+                    logger.debug('', exc_info=True)
+                    self._device_done(device, 'Move failed: {}'.format(exc))
+            # Catch devices that were already there
+            for device in list(self._pending):
+                try:
+                    value = device.state.get()
+                except Exception:
+                    logger.debug('', exc_info=True)
+                    continue
+                self._state_changed(obj=device, value=value)
+            if not devices:
+                self._finished(success=True)
+
+    def _state_changed(self, *args, obj, value, **kwargs):
+        with self._lock:
+            try:
+                target, accepted = self._pending[obj]
+            except KeyError:
+                return
+            target, accepted = _current_target(obj, target, accepted)
+            self._pending[obj] = (target, accepted)
+            if _matches_state(obj, target, accepted, value):
+                self.timing[obj.name] = time.monotonic() - self._start
+                self._device_done(obj)
+
+    def _device_done(self, device, reason=None):
+        del self._pending[device]
+        device.clear_sub(self._state_changed)
+        if reason is not None:
+            self.failures[device.name] = reason
+        device._done_moving(success=reason is None)
+        if not self._pending:
+            self._finished(success=not self.failures)
+
+    def _handle_failure(self):
+        for device, (target, _) in list(self._pending.items()):
+            self._device_done(device, 'Timed out waiting for state {}'
+                                      ''.format(target.name))
+
+
+def move_states(devices, states, timeout=None, settle_time=None, wait=False):
+    """
+    Move many `StatePositioner` devices at once.
+
+    Parameters
+    ----------
+    devices: ``list`` of `StatePositioner`
+        The devices to move.
+
+    states: ``list`` of ``str`` or ``int``
+        The target state of each device, in the same order.
+
+    timeout: ``float``, optional
+        The time to wait for all of the devices before failing.
+
+    settle_time: ``float``, optional
+        Time to wait after completion until running callbacks.
+
+    wait: ``bool``, optional
+        If ``True``, do not return until every device has finished.
+
+    Returns
+    -------
+    status: `StateGroupStatus`
+        ``Status`` that represents the progress of the whole group.
+    """
+    status = StateGroupStatus(devices, states, timeout=timeout,
+                              settle_time=settle_time)
+    if wait:
+        status_wait(status)
+    return status
+
+
+def _accepted_values(device, desired):
+    """
+    Every raw value that ``device.get_state`` resolves to ``desired``.
+    """
+    table = _state_lookup(device.states_enum)
+    return frozenset(key for key, state in table.items() if state is desired)
+
+
+def _current_target(device, desired, accepted):
+    """
+    Resolve ``desired`` and its accepted values again if ``device`` has
+    rebuilt its states enum since they were found, e.g. to add aliases.
+
+    Returns
+    -------
+    desired, accepted: ``tuple``
+    """
+    if type(desired) is device.states_enum:
+        return desired, accepted
+    desired = device.get_state(desired.name)
+    return desired, _accepted_values(device, desired)
+
+
+def _matches_state(device, desired, accepted, value):
+    """
+    Check if a raw state value is the ``desired`` state of ``device``.
+
+    ``accepted`` is the result of `_accepted_values`, which makes the usual
+    case a single set membership test.
+    """
+    try:
+        if value in accepted:
+            return True
+        if value in _state_lookup(device.states_enum):
+            return False
+    except TypeError:
+        # Unhashable value, resolve it the long way
+        pass
+    try:
+        return device.get_state(value).name == desired.name
+    except ValueError:
+        return False
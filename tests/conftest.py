@@ -17,6 +17,8 @@ class HotfixFakeEpicsSignal(FakeEpicsSignal):
         self._enum_strs = None
         super().__init__(read_pv, write_pv=write_pv, string=string, **kwargs)
         self._limits = None
+        if not hasattr(self, '_metadata'):
+            self._metadata = {}
 
     def get(self, *, as_string=None, connection_timeout=1.0, **kwargs):
         """
@@ -62,6 +64,9 @@ class HotfixFakeEpicsSignal(FakeEpicsSignal):
             enums will be 0, the next will be 1, etc.
         """
         self._enum_strs = enums
+        self._metadata['enum_strs'] = enums
+        if hasattr(self, 'SUB_META'):
+            self._run_subs(sub_type=self.SUB_META, **self._metadata)
 
     def check_value(self, value):
         """
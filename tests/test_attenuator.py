@@ -1,13 +1,22 @@
+import asyncio
 import logging
 import time
 import threading
+import numpy as np
 import pytest
 
 from unittest.mock import Mock
+from ophyd.device import Component as Cpt
+from ophyd.signal import Signal
 from ophyd.sim import make_fake_device
 from ophyd.status import wait as status_wait
 
-from pcdsdevices.attenuator import (Attenuator, MAX_FILTERS,
+from pcdsdevices.inout import TransmissionSignal
+from pcdsdevices.mv_interface import camonitor
+from pcdsdevices.attenuator import (Attenuator, FeeAtt, MAX_FILTERS,
+                                    TransmissionTable, register_material,
+                                    set_combined_attenuation,
+                                    solve_combined_attenuation,
                                     _att_classes, _att3_classes)
 
 logger = logging.getLogger(__name__)
@@ -46,6 +55,20 @@ def test_attenuator_states(fake_att):
     assert not att.inserted
 
 
+def test_attenuator_transmission_signal(fake_att):
+    logger.debug('test_attenuator_transmission_signal')
+    att = fake_att
+    trans = TransmissionSignal([att], name='trans')
+    assert trans.get() == 1
+    # The done PV can report the move before the readback updates
+    att.done.sim_put(1)
+    att.readback.sim_put(0.5)
+    assert trans.get() == 0.5
+    att.readback.sim_put(0.25)
+    att.done.sim_put(0)
+    assert trans.get() == 0.25
+
+
 def fake_move_transition(att, status, goal):
     """
     Set to the PVs sort of like it would happen in the real world and check the
@@ -133,6 +156,62 @@ def test_attenuator_calcpend(fake_att):
     assert time.time() - start >= 1
 
 
+@pytest.mark.timeout(5)
+def test_attenuator_calcpend_async():
+    logger.debug('test_attenuator_calcpend_async')
+    atts = [Attenuator('TST:ASYNC{}'.format(i), 2, name='async{}'.format(i))
+            for i in range(5)]
+    for att in atts:
+        att.calcpend.sim_put(1)
+        att.setpoint.sim_put(0.5)
+        att.trans_ceil.sim_put(0.6)
+        att.trans_floor.sim_put(0.1)
+
+    def finish():
+        time.sleep(0.3)
+        for att in atts:
+            att.calcpend.sim_put(0)
+
+    async def actuate_all():
+        return await asyncio.gather(*(att.async_actuate_value()
+                                      for att in atts))
+
+    loop = asyncio.new_event_loop()
+    try:
+        threading.Thread(target=finish).start()
+        start = time.time()
+        values = loop.run_until_complete(actuate_all())
+        # All of the waits overlap
+        assert 0.2 < time.time() - start < 1
+        assert values == [3] * 5
+        atts[0].calcpend.sim_put(1)
+        done = loop.run_until_complete(atts[0].async_wait_calc(timeout=0.1))
+        assert not done
+    finally:
+        loop.close()
+
+
+@pytest.mark.timeout(5)
+def test_attenuator_camonitor(fake_att, capsys):
+    logger.debug('test_attenuator_camonitor')
+    att = fake_att
+    att.readback.sim_put(0.5)
+    stop = threading.Event()
+    thread = threading.Thread(target=camonitor, args=(att,),
+                              kwargs=dict(interval=0.01, stop_event=stop))
+    thread.start()
+    time.sleep(0.1)
+    att.readback.sim_put(0.25)
+    att.done.sim_put(1)
+    att.done.sim_put(0)
+    time.sleep(0.1)
+    stop.set()
+    thread.join()
+    rows = capsys.readouterr().out.split('\r')[1:]
+    assert rows[0].split() == ['0.500000']
+    assert rows[-1].split() == ['0.250000']
+
+
 @pytest.mark.timeout(5)
 def test_attenuator_set_energy(fake_att):
     logger.debug('test_attenuator_set_energy')
@@ -169,3 +248,269 @@ def test_attenuator_third_harmonic():
     logger.debug('test_attenuator_third_harmonic')
     att = Attenuator('TRD:ATT', MAX_FILTERS-1, name='third', use_3rd=True)
     att.wait_for_connection()
+
+
+def test_transmission_table():
+    logger.debug('test_transmission_table')
+    blades = [0.5 ** (2 ** i) for i in range(4)]
+    table = TransmissionTable(blades)
+    assert len(table.transmissions) == 16
+    # Every power of 1/2 from 0 to 15 is achievable
+    assert np.allclose(table.transmissions, 0.5 ** np.arange(16)[::-1])
+    combo, trans = table.nearest(0.26)
+    assert trans == 0.25
+    assert table.states(combo) == [False, True, False, False]
+    floor, ceil = table.floor_ceil(0.3)
+    assert (floor[1], ceil[1]) == (0.25, 0.5)
+    assert table.nearest(2)[1] == 1
+    assert table.nearest(0)[1] == 0.5 ** 15
+    # Blade 1 stuck in
+    table = TransmissionTable(blades, fixed={1: True})
+    assert len(table.transmissions) == 8
+    assert table.nearest(1)[1] == 0.25
+
+
+@pytest.mark.timeout(5)
+def test_attenuator_local_solver(fake_att):
+    logger.debug('test_attenuator_local_solver')
+    att = fake_att
+    register_material('Si', lambda energy: energy / 1000)
+    att.energy.sim_put(1000)
+    for i, filt in enumerate(att.filters):
+        filt.thickness.put(2 ** i * np.log(2))
+        filt.material.put('Si')
+        filt.stuck.put(0)
+    states, trans = att.solve_transmission(0.125)
+    assert np.isclose(trans, 0.125)
+    assert states == [True, True, False] + [False] * (len(att.filters) - 3)
+
+    status = att.set_transmission(0.125, wait=True, timeout=1)
+    assert status.success
+    assert att.filter1.inserted
+    assert att.filter2.inserted
+    assert att.filter3.removed
+
+    # Blades that are already in place or stuck get no put
+    for filt in att.filters:
+        filt.state.put = Mock(wraps=filt.state.put)
+    att.set_transmission(0.125, wait=True, timeout=1)
+    assert not any(filt.state.put.called for filt in att.filters)
+    # A blade that sticks after the table was made is held where it is
+    att.filter3.stuck.put(1)
+    states, trans = att.solve_transmission(1 / 16)
+    assert not states[2]
+    assert not np.isclose(trans, 1 / 16)
+    att.set_transmission(1 / 16, wait=True, timeout=1)
+    assert not att.filter3.state.put.called
+    assert att.filter3.removed
+    assert [filt.inserted for filt in att.filters] == states
+    att.filter3.stuck.put(0)
+    att.set_transmission(0.125, wait=True, timeout=1)
+
+    # Compare with the IOC's readback for the inserted blades
+    att.setpoint.sim_put(0.5)
+    att.readback.sim_put(0.125)
+    assert att.check_transmission()
+    att.readback.sim_put(0.5)
+    assert not att.check_transmission()
+    # Nothing is written to the IOC
+    assert att.setpoint.get() == 0.5
+
+    att.filter2.stuck.put(1)
+    att.clear_transmission_table()
+    states, trans = att.solve_transmission(1)
+    assert states[1]
+    assert np.isclose(trans, 0.25)
+
+    att.filters[0].material.put('Unobtainium')
+    att.clear_transmission_table()
+    with pytest.raises(ValueError, match='register_material'):
+        att.solve_transmission(0.5)
+
+
+def make_solver_att(prefix, thicknesses):
+    att = Attenuator(prefix, len(thicknesses), name=prefix.lower())
+    att.energy.sim_put(1000)
+    for filt, thickness in zip(att.filters, thicknesses):
+        filt.state.put('OUT')
+        filt.thickness.put(thickness)
+        filt.material.put('Si')
+        filt.stuck.put(0)
+    return att
+
+
+class FeeAttDone(FeeAtt):
+    # The FEE IOC has no done PV to fake
+    done = Cpt(Signal, value=0)
+
+
+@pytest.mark.timeout(5)
+def test_fee_att_combined_attenuation():
+    logger.debug('test_fee_att_combined_attenuation')
+    register_material('Si', lambda energy: energy / 1000)
+    FakeFee = make_fake_device(FeeAttDone)
+    fee = FakeFee('SATT:FEE1:320', name='fee')
+    fee.energy.sim_put(1000)
+    for filt in fee.filters:
+        filt.state.sim_put(2)
+    with pytest.raises(ValueError):
+        fee.transmission_table()
+    with pytest.raises(ValueError):
+        FakeFee('SATT:FEE1:320', name='fee', thicknesses=[1, 2])
+    fee_thick = [0.01 * 2**i for i in range(9)]
+    fee = FakeFee('SATT:FEE1:320', name='fee', thicknesses=fee_thick)
+    fee.energy.sim_put(1000)
+    for filt in fee.filters:
+        filt.state.sim_put(2)
+    hutch = make_solver_att('TST:HUTCH', [0.3, 3.7])
+    thick = np.array(fee_thick + [0.3, 3.7])
+    combos = (np.arange(2**11)[:, None] >> np.arange(11)) & 1
+    every = np.exp(-(combos * thick).sum(axis=1))
+    for goal in (1, 0.42, 0.05, 1e-3):
+        states, achieved = solve_combined_attenuation(goal, fee, hutch,
+                                                      rtol=0)
+        assert np.isclose(achieved, every[np.abs(every - goal).argmin()])
+        inserted = states[0] + states[1]
+        assert np.isclose(np.exp(-thick[inserted].sum()), achieved)
+
+
+@pytest.mark.timeout(5)
+def test_combined_attenuation():
+    logger.debug('test_combined_attenuation')
+    register_material('Si', lambda energy: energy / 1000)
+    fee = make_solver_att('TST:FEE', [0.3, 0.7, 1.1])
+    hutch = make_solver_att('TST:HUTCH', [0.2, 0.5, 1.3, 2.9, 4.1])
+    # Brute force over all 2**8 combinations
+    thick = np.array([0.3, 0.7, 1.1, 0.2, 0.5, 1.3, 2.9, 4.1])
+    combos = (np.arange(2**8)[:, None] >> np.arange(8)) & 1
+    every = np.exp(-(combos * thick).sum(axis=1))
+    for goal in (1, 0.8, 0.31, 0.05, 1e-3, 1e-6):
+        states, achieved = solve_combined_attenuation(goal, fee, hutch,
+                                                      rtol=0)
+        assert np.isclose(achieved, every[np.abs(every - goal).argmin()])
+        inserted = states[0] + states[1]
+        assert np.isclose(np.exp(-thick[inserted].sum()), achieved)
+
+    status = set_combined_attenuation(np.exp(-1.0), fee, hutch, rtol=0,
+                                      wait=True, timeout=1)
+    assert status.success
+    assert fee.filter2.inserted and hutch.filter3.removed
+    assert set(status.devices) == {fee.filter1, fee.filter2}
+    # Already there, so nothing moves
+    status = set_combined_attenuation(np.exp(-1.0), fee, hutch, rtol=0)
+    assert status.done and not status.devices
+
+
+@pytest.mark.timeout(5)
+def test_combined_attenuation_three_devices():
+    logger.debug('test_combined_attenuation_three_devices')
+    register_material('Si', lambda energy: energy / 1000)
+    blades = [[.537, .702, .462, .256], [.511, .979], [.898, .869]]
+    atts = [make_solver_att('TST:THREE{}'.format(i), -np.log(trans))
+            for i, trans in enumerate(blades)]
+    # Nothing reaches the goal, so every blade goes in
+    for goal in (0, 1e-3):
+        for rtol in (0, 1e-3):
+            states, achieved = solve_combined_attenuation(goal, *atts,
+                                                          rtol=rtol)
+            assert all(all(att_states) for att_states in states)
+            assert np.isclose(achieved, np.prod(np.concatenate(blades)))
+    status = set_combined_attenuation(0, *atts, wait=True, timeout=1)
+    assert status.success
+    assert all(filt.inserted for att in atts for filt in att.filters)
+
+
+@pytest.mark.timeout(5)
+def test_combined_attenuation_fewest_moves():
+    logger.debug('test_combined_attenuation_fewest_moves')
+    register_material('Si', lambda energy: energy / 1000)
+    first = make_solver_att('TST:ONE', [1.0, 2.0])
+    second = make_solver_att('TST:TWO', [1.0, 4.0])
+    # Either 1.0 blade gives the same result, so keep the one already in
+    second.filter1.state.put('IN')
+    states, achieved = solve_combined_attenuation(np.exp(-1.0), first,
+                                                  second)
+    assert states == [[False, False], [True, False]]
+    first.filter1.state.put('IN')
+    second.filter1.state.put('OUT')
+    states, achieved = solve_combined_attenuation(np.exp(-1.0), first,
+                                                  second)
+    assert states == [[True, False], [False, False]]
+
+
+@pytest.mark.timeout(5)
+def test_attenuator_telemetry(fake_att):
+    logger.debug('test_attenuator_telemetry')
+    att = fake_att
+    for filt in att.filters:
+        filt.stuck.put(0)
+    # Nothing is built or recorded until used
+    att.filter1.insert(wait=True)
+    assert 'telemetry' not in att._signals
+    assert not att.telemetry.enabled
+    assert att.telemetry.events.size == 0
+    att.filter1.remove(wait=True)
+
+    att.enable_telemetry(size=4)
+    for i in range(3):
+        att.filter1.insert(wait=True)
+        att.filter1.remove(wait=True)
+    att.filter2.insert(wait=True)
+    att.filter3.stuck.put(1)
+    att.filter3.stuck.put(1)
+
+    tel = att.telemetry
+    assert list(tel.insertion_counts[:3]) == [3, 1, 0]
+    assert list(tel.removal_counts[:3]) == [3, 0, 0]
+    assert list(tel.stuck_counts[:3]) == [0, 0, 1]
+    # Only the newest events fit in the ring buffer
+    events = tel.events
+    assert len(events) == 4
+    assert list(events['blade']) == [0, 0, 1, 2]
+    assert list(events['event']) == [tel.INSERT, tel.REMOVE, tel.INSERT,
+                                     tel.STUCK]
+    assert np.all(events['duration'][:3] >= 0)
+    assert np.isnan(events['duration'][3])
+    assert np.all(tel.mean_move_times[:2] < 0.5)
+    hist = tel.move_time_histogram.get()
+    assert hist.shape == (len(att.filters), len(tel.move_time_edges) + 1)
+    assert hist[0, 0] == 2 and hist[1, 0] == 1
+
+    reading = tel.read()
+    assert list(reading[tel.insertions.name]['value'][:2]) == [3, 1]
+
+    # Moves made elsewhere are counted but not timed
+    att.filter2.state.put('OUT')
+    assert tel.removal_counts[1] == 1
+    assert np.isnan(tel.events['duration'][-1])
+
+    att.disable_telemetry()
+    att.filter1.insert(wait=True)
+    assert tel.insertion_counts[0] == 3
+    tel.clear()
+    assert tel.insertion_counts.sum() == 0
+
+
+def test_attenuator_class_cache():
+    logger.debug('test_attenuator_class_cache')
+    assert list(_att_classes) == list(range(1, MAX_FILTERS + 1))
+    assert _att_classes[3] is _att_classes[3]
+    assert _att_classes[3] is not _att3_classes[3]
+    with pytest.raises(KeyError):
+        _att_classes[MAX_FILTERS + 1]
+    with pytest.raises(KeyError):
+        _att_classes[0]
+
+
+@pytest.mark.timeout(5)
+def test_attenuator_lazy_filters():
+    logger.debug('test_attenuator_lazy_filters')
+    att = Attenuator('TST:LAZY', 4, name='lazy')
+    assert len(att.filters) == 4
+    assert not any(name.startswith('filter') for name in att._signals)
+    filt = att.filters[1]
+    assert filt is att.filter2
+    assert [name for name in att._signals
+            if name.startswith('filter')] == ['filter2']
+    assert att.filters[-1] is att.filter4
+    assert att.filters[:2] == [att.filter1, att.filter2]
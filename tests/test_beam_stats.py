@@ -35,6 +35,9 @@ def test_beam_stats_avg(fake_beam_stats):
         stats.mj.sim_put(i)
 
     assert stats.mj_avg.value == sum(range(10))/10
+    assert stats.mj_min.get() == 0
+    assert stats.mj_max.get() == 9
+    assert stats.mj_std.get() > 0
 
     stats.configure(dict(mj_buffersize=20))
     cfg = stats.read_configuration()
@@ -1,4 +1,5 @@
 import logging
+import math
 from unittest.mock import Mock
 
 import pytest
@@ -6,23 +7,28 @@ from ophyd.sim import make_fake_device
 
 from pcdsdevices.inout import (InOutPositioner,
                                InOutRecordPositioner,
-                               InOutPVStatePositioner)
+                               InOutPVStatePositioner,
+                               TransmissionSignal, remove_all)
 
 from conftest import HotfixFakeEpicsSignal
 
 logger = logging.getLogger(__name__)
 
 
-@pytest.fixture(scope='function')
-def fake_inout():
+def make_fake_inout(prefix='Test:Ref', name='test'):
     Fake = make_fake_device(InOutRecordPositioner)
     Fake.state.cls = HotfixFakeEpicsSignal
-    inout = Fake('Test:Ref', name='test')
+    inout = Fake(prefix, name=name)
     inout.state.sim_put(0)
     inout.state.sim_set_enum_strs(('Unknown', 'IN', 'OUT'))
     return inout
 
 
+@pytest.fixture(scope='function')
+def fake_inout():
+    return make_fake_inout()
+
+
 def test_inout_states(fake_inout):
     logger.debug('test_inout_states')
     inout = fake_inout
@@ -34,6 +40,23 @@ def test_inout_states(fake_inout):
     assert inout.removed
 
 
+def test_inout_snapshot(fake_inout):
+    logger.debug('test_inout_snapshot')
+    inout = fake_inout
+    inout.state.put('IN')
+    assert inout.insertion_snapshot() == (True, False, 0)
+    inout.state.put('OUT')
+    snapshot = inout.insertion_snapshot()
+    assert not snapshot.inserted
+    assert snapshot.removed
+    assert snapshot.transmission == 1
+    inout.state.put('Unknown')
+    snapshot = inout.insertion_snapshot()
+    assert not snapshot.inserted
+    assert not snapshot.removed
+    assert math.isnan(snapshot.transmission)
+
+
 def test_inout_trans(fake_inout):
     logger.debug('test_inout_trans')
     inout = fake_inout
@@ -66,6 +89,47 @@ def test_inout_subscriptions(fake_inout):
     assert cb.called
 
 
+def test_remove_all():
+    logger.debug('test_remove_all')
+    devices = [make_fake_inout('Test:Ref{}'.format(i), 'test{}'.format(i))
+               for i in range(4)]
+    for device in devices[:3]:
+        device.insert()
+    devices[3].remove()
+    status = remove_all(devices, wait=True)
+    assert status.success
+    assert all(device.removed for device in devices)
+    # Devices that were already out were not moved
+    assert set(status.timing) == set(dev.name for dev in devices[:3])
+
+
+def test_transmission_signal():
+    logger.debug('test_transmission_signal')
+    devices = [make_fake_inout('Test:Ref{}'.format(i), 'test{}'.format(i))
+               for i in range(3)]
+    for device in devices:
+        device.remove()
+    for device in devices[1:]:
+        device._trans_enum[1] = 0.5
+    trans = TransmissionSignal(devices, name='trans')
+    assert trans.get() == 1
+    cb = Mock()
+    trans.subscribe(cb, run=False)
+    devices[1].insert()
+    assert trans.get() == 0.5
+    assert cb.called
+    devices[2].insert()
+    assert trans.get() == 0.25
+    devices[0].insert()
+    assert trans.get() == 0
+    devices[1].state.put('Unknown')
+    assert math.isnan(trans.get())
+    devices[1].remove()
+    assert trans.get() == 0
+    devices[0].remove()
+    assert trans.get() == 0.5
+
+
 def test_subcls_warning():
     logger.debug('test_subcls_warning')
     with pytest.raises(TypeError):
@@ -1,3 +1,4 @@
+import asyncio
 import fcntl
 import logging
 import multiprocessing as mp
@@ -5,11 +6,15 @@ import threading
 import time
 import os
 import signal
+from unittest.mock import patch
 
 import pylab
 import pytest
 
-from pcdsdevices.mv_interface import setup_preset_paths
+from pcdsdevices.mv_interface import (FileLockStats, Presets,
+                                      acquire_file_lock,
+                                      async_acquire_file_lock, camonitor,
+                                      setup_preset_paths, wm_snapshot)
 from pcdsdevices.sim import FastMotor, SlowMotor
 
 logger = logging.getLogger(__name__)
@@ -54,6 +59,70 @@ def test_camonitor(fast_motor):
     fast_motor.camonitor()
 
 
+@pytest.mark.timeout(5)
+def test_camonitor_multi(capsys):
+    logger.debug('test_camonitor_multi')
+    motors = [FastMotor(name='mon_{}'.format(i)) for i in range(3)]
+    stop = threading.Event()
+    thread = threading.Thread(target=camonitor, args=motors,
+                              kwargs=dict(interval=0.05, stop_event=stop))
+    thread.start()
+    time.sleep(0.1)
+    for i in range(20):
+        motors[1].move(i, wait=True)
+    motors[2].move(7, wait=True)
+    time.sleep(0.2)
+    stop.set()
+    thread.join()
+    out = capsys.readouterr().out
+    assert out.splitlines()[0].split() == ['mon_0', 'mon_1', 'mon_2']
+    rows = out.split('\r')[1:]
+    # Throttled: far fewer redraws than updates, and the last row is current
+    assert len(rows) < 10
+    assert rows[-1].split() == ['0.000000', '19.000000', '7.000000']
+    for motor in motors:
+        assert not any(motor._callbacks[motor.SUB_READBACK].values())
+
+
+class BrokenMotor(FastMotor):
+    def wm(self):
+        raise TimeoutError('not connected')
+
+
+class LaggingMotor(FastMotor):
+    def wm(self):
+        time.sleep(0.2)
+        return super().wm()
+
+
+@pytest.mark.timeout(5)
+def test_wm_snapshot():
+    logger.debug('test_wm_snapshot')
+    motors = [LaggingMotor(name='lag_{}'.format(i), init_pos=i)
+              for i in range(10)]
+    start = time.monotonic()
+    readings = wm_snapshot(motors)
+    # Ten 0.2s reads run concurrently
+    assert time.monotonic() - start < 1
+    assert [r.name for r in readings] == [m.name for m in motors]
+    assert [r.position for r in readings] == list(range(10))
+    for reading in readings:
+        assert reading.error is None
+        assert reading.latency >= 0.2
+        assert reading.timestamp is not None
+
+    broken = BrokenMotor(name='broken')
+    readings = wm_snapshot([broken, FastMotor(name='ok', init_pos=3)])
+    assert readings[0].position is None
+    assert 'not connected' in readings[0].error
+    assert readings[1].position == 3
+
+    readings = wm_snapshot([LaggingMotor(name='slow')], timeout=0.05)
+    assert readings[0].position is None
+    assert 'Timed out' in readings[0].error
+    assert wm_snapshot([]) == []
+
+
 def test_mv_ginput(monkeypatch, fast_motor):
     logger.debug('test_mv_ginput')
 
@@ -157,6 +226,214 @@ def test_presets(presets, fast_motor):
     assert hasattr(fast_motor, 'mv_sample')
 
 
+def test_presets_store(presets, fast_motor):
+    logger.debug('test_presets_store')
+    store = fast_motor.presets._store
+    fast_motor.presets.add_hutch('zero', 0)
+    loads = store.loads
+    # Unchanged files are not parsed again
+    for i in range(5):
+        fast_motor.presets.sync()
+    assert store.loads == loads
+    assert fast_motor.wm_zero() == 0
+
+    # Edits from elsewhere are picked up
+    path = fast_motor.presets.positions.zero.path
+    with open(path) as f:
+        text = f.read()
+    with open(path, 'w') as f:
+        f.write(text.replace('value: 0', 'value: 5'))
+    fast_motor.presets.sync()
+    assert store.loads == loads + 1
+    assert fast_motor.wm_zero() == 5
+
+    # Same size and file times, as on NFS with coarse timestamps
+    with patch.object(store, '_key', return_value=(('same',), False)):
+        fast_motor.presets.sync()
+        loads = store.loads
+        with open(path) as f:
+            text = f.read()
+        with open(path, 'w') as f:
+            f.write(text.replace('value: 5', 'value: 6'))
+        fast_motor.presets.sync()
+        assert store.loads == loads + 1
+        assert fast_motor.wm_zero() == 6
+        fast_motor.presets.sync()
+        assert store.loads == loads + 1
+
+
+def test_presets_consolidated(presets):
+    logger.debug('test_presets_consolidated')
+    folder = Presets._paths['hutch'].parent
+    setup_preset_paths(hutch=str(folder / 'hutch.yml'))
+    motors = [FastMotor(name='cons_{}'.format(i)) for i in range(20)]
+    motors[0].presets.add_hutch('inside', 1)
+    motors[1].presets.add_hutch('outside', 2)
+    assert motors[0].wm_inside() == 1
+    assert motors[1].wm_outside() == 2
+    assert not hasattr(motors[0], 'wm_outside')
+
+    # Every device reads the one file, which is parsed once
+    store = Presets._store
+    store.clear()
+    loads = store.loads
+    setup_preset_paths(hutch=str(folder / 'hutch.yml'))
+    assert store.loads == loads + 1
+    assert motors[0].wm_inside() == 1
+    assert motors[1].wm_outside() == 2
+    assert motors[1].presets.positions.outside.path.endswith('hutch.yml')
+    assert not (folder / 'hutch' / 'cons_0.yml').exists()
+
+
+def test_presets_journal(presets, fast_motor):
+    logger.debug('test_presets_journal')
+    fast_motor.presets.add_hutch('zero', 0, comment='center')
+    position = fast_motor.presets.positions.zero
+    size = os.path.getsize(position.path)
+    journal_path = fast_motor.presets._history_path('hutch')
+    journal = fast_motor.presets._journal
+    for i in range(1, 20):
+        journal.append(journal_path, dict(device='sim_fast', preset='zero',
+                                          time=str(i), value=i,
+                                          entry='{:10.4f}'.format(i)))
+    position.update_pos(5, comment='latest')
+    # The preset file only holds the current value
+    assert os.path.getsize(position.path) == size
+    assert position.pos == 5
+    assert len(journal.history(journal_path, 'sim_fast', 'zero')) == 21
+    assert position.history['19'] == '   19.0000'
+    latest = journal.history(journal_path, 'sim_fast', 'zero')[-1]
+    assert latest['value'] == 5
+    assert latest['comment'] == 'latest'
+
+    fast_motor.presets.compact_history(keep=3)
+    assert len(position.history) == 3
+    with open(str(journal_path)) as f:
+        assert len(f.readlines()) == 4
+    assert journal.history(journal_path, 'sim_fast', 'zero')[-1]['value'] == 5
+
+
+def test_presets_legacy_history(presets, fast_motor):
+    logger.debug('test_presets_legacy_history')
+    path = Presets._paths['user'] / 'sim_fast.yml'
+    with open(str(path), 'w') as f:
+        f.write('sample:\n'
+                '  active: true\n'
+                '  history:\n'
+                '    01 Jan 2018 00:00:00: \'    1.0000 old\'\n'
+                '  value: 1.0\n')
+    fast_motor.presets.sync()
+    position = fast_motor.presets.positions.sample
+    assert position.history == {'01 Jan 2018 00:00:00': '    1.0000 old'}
+    fast_motor.presets.compact_history()
+    assert 'history' not in position.info
+    assert list(position.history.values()) == ['    1.0000 old']
+
+
+def test_presets_numpy_values(presets, fast_motor):
+    logger.debug('test_presets_numpy_values')
+    # Older files were written by yaml.dump with numpy 1.x values
+    path = Presets._paths['user'] / 'sim_fast.yml'
+    with open(str(path), 'w') as f:
+        f.write('sample:\n'
+                '  active: true\n'
+                '  value: !!python/object/apply:numpy.core.multiarray.scalar\n'
+                '  - !!python/object/apply:numpy.dtype\n'
+                '    args: [f8, 0, 1]\n'
+                '    state: !!python/tuple [3, <, null, null, null, -1, -1,'
+                ' 0]\n'
+                '  - !!binary |\n'
+                '    AAAAAAAA+D8=\n')
+    fast_motor.presets.sync()
+    position = fast_motor.presets.positions.sample
+    assert position.pos == 1.5
+    position.update_pos(2)
+    with open(str(path)) as f:
+        assert 'numpy' not in f.read()
+    assert fast_motor.presets.positions.sample.pos == 2
+
+
+def test_presets_lock_threads(presets, fast_motor):
+    logger.debug('test_presets_lock_threads')
+    stats = Presets.lock_stats
+    stats.clear()
+    fast_motor.presets.add_user('start', 0)
+
+    def add(i):
+        fast_motor.presets._update('user', 'pos_{}'.format(i), value=i)
+
+    threads = [threading.Thread(target=add, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    fast_motor.presets.sync()
+    positions = fast_motor.presets.positions
+    for i in range(8):
+        assert getattr(positions, 'pos_{}'.format(i)).pos == i
+    assert stats.acquired >= 9
+    assert stats.timeouts == 0
+
+
+def test_file_lock_wait(presets, fast_motor):
+    logger.debug('test_file_lock_wait')
+    fast_motor.presets.add_user('sample', 0)
+    path = fast_motor.presets.positions.sample.path
+    stats = FileLockStats()
+
+    def hold(seconds):
+        with open(path, 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            time.sleep(seconds)
+
+    thread = threading.Thread(target=hold, args=(0.2,))
+    thread.start()
+    time.sleep(0.05)
+    with open(path, 'r+') as f:
+        acquire_file_lock(f, timeout=2, stats=stats)
+        fcntl.flock(f, fcntl.LOCK_UN)
+    thread.join()
+    assert stats.acquired == 1
+    assert stats.contended == 1
+    assert 0.05 < stats.max_wait < 1
+
+    thread = threading.Thread(target=hold, args=(0.5,))
+    thread.start()
+    time.sleep(0.05)
+    loop = asyncio.new_event_loop()
+    try:
+        with open(path, 'r+') as f:
+            with pytest.raises(BlockingIOError):
+                loop.run_until_complete(
+                    async_acquire_file_lock(f, timeout=0.1, stats=stats))
+            thread.join()
+            loop.run_until_complete(
+                async_acquire_file_lock(f, timeout=0.1, stats=stats))
+    finally:
+        loop.close()
+    assert stats.as_dict()['timeouts'] == 1
+    assert stats.acquired == 2
+
+
+def test_presets_lazy_methods(presets, fast_motor):
+    logger.debug('test_presets_lazy_methods')
+    for i in range(50):
+        fast_motor.presets._update('user', 'pos_{}'.format(i), value=i)
+    fast_motor.presets.sync()
+    # Nothing is installed on the device, but everything resolves
+    assert 'wm_pos_3' not in vars(fast_motor)
+    assert fast_motor.wm_pos_3() == 3
+    fast_motor.umv_pos_7()
+    assert fast_motor.wm() == 7
+    assert {'mv_pos_49', 'umv_pos_49', 'wm_pos_49'} <= set(dir(fast_motor))
+    assert 'pos_49' in dir(fast_motor.presets.positions)
+    assert {'add_user', 'add_here_user'} <= set(dir(fast_motor.presets))
+    assert not hasattr(fast_motor, 'wm_pos_50')
+    assert not hasattr(fast_motor.presets, 'add_beamline')
+    # Components are still found through the same lookup
+    assert fast_motor.user_readback.get() == 7
+
+
 def test_presets_type(presets, fast_motor):
     logger.debug('test_presets_type')
     # Mess up the input types, fail before opening the file
@@ -1,13 +1,89 @@
+import gc
 import logging
+import math
+import threading
+import time
+import weakref
 from unittest.mock import Mock
 
+import numpy as np
+import pytest
 from ophyd.signal import Signal
 
-from pcdsdevices.signal import AvgSignal
+from pcdsdevices.signal import (AggregateSignal, AvgSignal,
+                                pending_connections, run_when_connected)
 
 logger = logging.getLogger(__name__)
 
 
+class SumSignal(AggregateSignal):
+    def __init__(self, *signals, name):
+        super().__init__(name=name)
+        self._sub_signals.extend(signals)
+
+    def _calc_readback(self):
+        return sum(self._cache[sig] for sig in self._sub_signals)
+
+
+def test_aggregate_signal():
+    logger.debug('test_aggregate_signal')
+    one = Signal(name='one', value=1)
+    two = Signal(name='two', value=2)
+    agg = SumSignal(one, two, name='sum')
+    assert agg.get() == 3
+    cb = Mock()
+    agg.subscribe(cb, run=False)
+    one.put(2)
+    assert agg.value == 4
+    assert cb.call_count == 1
+    two.put(3)
+    assert agg.value == 5
+    assert cb.call_count == 2
+
+
+def test_aggregate_signal_coalesce():
+    logger.debug('test_aggregate_signal_coalesce')
+    one = Signal(name='one', value=1)
+    two = Signal(name='two', value=2)
+    agg = SumSignal(one, two, name='sum')
+    # Long enough that the window can't close during the test
+    agg._coalesce_window = 60
+    cb = Mock()
+    agg.subscribe(cb, run=False)
+    one.put(2)
+    one.put(3)
+    two.put(4)
+    # Nothing happens until the window closes
+    assert not cb.called
+    agg._flush_pending()
+    assert cb.call_count == 1
+    assert cb.call_args[1]['value'] == 7
+    assert agg.coalesce_stats == dict(dropped=1, merged=1)
+    # The shared dispatcher closes the window on its own
+    agg._coalesce_window = 0.01
+    done = threading.Event()
+    agg.subscribe(lambda **kwargs: done.set(), run=False)
+    one.put(5)
+    assert done.wait(5)
+    assert agg.value == 9
+
+
+def test_aggregate_signal_coalesce_refresh():
+    logger.debug('test_aggregate_signal_coalesce_refresh')
+    one = Signal(name='one', value=1)
+    two = Signal(name='two', value=2)
+    agg = SumSignal(one, two, name='sum')
+    agg._coalesce_window = 60
+    agg.subscribe(Mock(), run=False)
+    one.put(10)
+    # The readback moves on before the window closes
+    one._readback = 20
+    assert agg.get() == 22
+    agg._flush_pending()
+    # The held update must not replace the newer value
+    assert agg.get() == 22
+
+
 def test_avg_signal():
     logger.debug('test_avg_signal')
     sig = Signal(name='raw')
@@ -22,16 +98,310 @@ def test_avg_signal():
     sig.put(2)
     assert avg.value == 2.5
 
+    # Resizing keeps the newest values
     avg.averages = 3
 
     sig.put(1)
-    assert avg.value == 1
-    sig.put(3)
     assert avg.value == 2
+    sig.put(4)
+    assert avg.value == 7/3
+    avg.averages = 2
     sig.put(2)
-    assert avg.value == 2
+    assert avg.value == 3
+
+    avg.clear()
+    sig.put(1)
+    assert avg.value == 1
 
     cb = Mock()
     avg.subscribe(cb)
     sig.put(0)
     assert cb.called
+
+
+def test_aggregate_signal_snapshot():
+    logger.debug('test_aggregate_signal_snapshot')
+    one = Signal(name='one', value=1)
+    two = Signal(name='two', value=2)
+    agg = SumSignal(one, two, name='sum')
+    agg._snapshot_max_age = 5.0
+    one.get = Mock(wraps=one.get)
+    # Not monitored, every get goes to the sub-signals
+    agg.get()
+    agg.get()
+    assert one.get.call_count == 2
+    agg.subscribe(Mock(), run=False)
+    count = one.get.call_count
+    # Monitored, reads come from the last computed value
+    assert agg.get() == 3
+    two.put(4)
+    assert agg.get() == 5
+    assert one.get.call_count == count
+    # Stale values are refreshed
+    agg._snapshot_max_age = 0
+    assert agg.get() == 5
+    assert one.get.call_count == count + 1
+
+
+def test_aggregate_signal_no_snapshot():
+    logger.debug('test_aggregate_signal_no_snapshot')
+    one = Signal(name='one', value=1)
+    two = Signal(name='two', value=2)
+    agg = SumSignal(one, two, name='sum')
+    agg.subscribe(Mock(), run=False)
+    # Cached reads are off unless a class asks for them
+    one.get = Mock(wraps=one.get)
+    assert agg.get() == 3
+    assert agg.get() == 3
+    assert one.get.call_count == 2
+
+
+class BarrierSignal(Signal):
+    def __init__(self, barrier, **kwargs):
+        super().__init__(**kwargs)
+        self.barrier = barrier
+
+    def get(self, **kwargs):
+        # Only passes if every sub-signal is being read at the same time
+        self.barrier.wait()
+        return super().get(**kwargs)
+
+
+def test_aggregate_signal_parallel_get():
+    logger.debug('test_aggregate_signal_parallel_get')
+    barrier = threading.Barrier(4, timeout=5)
+    signals = [BarrierSignal(barrier, name='slow{}'.format(i), value=i)
+               for i in range(4)]
+    agg = SumSignal(*signals, name='sum')
+    agg._parallel_get = True
+    assert agg.get() == 6
+    assert not barrier.broken
+    latency = agg.get_latency
+    assert set(latency) == set(sig.name for sig in signals)
+    assert all(value >= 0 for value in latency.values())
+
+
+def test_avg_signal_stats():
+    logger.debug('test_avg_signal_stats')
+    sig = Signal(name='raw')
+    avg = AvgSignal(sig, 4, name='avg')
+    assert math.isnan(avg.mean)
+    assert avg.count == 0
+    values = [3, float('nan'), 1, 5, 2, 8, float('nan'), 4, 6, 7, 0]
+    for i, value in enumerate(values):
+        sig.put(value)
+        window = np.array(values[max(0, i-3):i+1], dtype=float)
+        assert avg.count == np.count_nonzero(~np.isnan(window))
+        assert np.isclose(avg.value, np.nanmean(window))
+        assert np.isclose(avg.variance, np.nanvar(window))
+        assert np.isclose(avg.std, np.nanstd(window))
+        assert avg.minimum == np.nanmin(window)
+        assert avg.maximum == np.nanmax(window)
+
+
+def test_avg_signal_constant_time():
+    logger.debug('test_avg_signal_constant_time')
+    # Full passes over the buffer happen once per buffer's worth of updates
+    for averages in (10, 100000):
+        sig = Signal(name='raw')
+        avg = AvgSignal(sig, averages, name='avg')
+        resum = Mock(wraps=avg._stats._resum)
+        avg._stats._drift._resum = resum
+        for i in range(2000):
+            avg._update_avg(value=i)
+        assert resum.call_count == 2000 // averages
+        window = np.arange(max(0, 2000 - averages), 2000)
+        assert np.isclose(avg.mean, window.mean())
+
+
+def test_avg_signal_time():
+    logger.debug('test_avg_signal_time')
+    sig = Signal(name='raw')
+    avg = AvgSignal(sig, 1, name='avg', mode='time', duration=5)
+    for i in range(100):
+        avg._update_avg(value=i, timestamp=i)
+        window = np.arange(max(0, i-5), i+1)
+        assert avg.count == len(window)
+        assert avg.mean == window.mean()
+        assert avg.minimum == window.min()
+        assert avg.maximum == window.max()
+        assert np.isclose(avg.variance, window.var())
+    assert list(avg.values) == list(range(94, 100))
+    # A shorter window keeps the values that fit
+    avg.duration = 2
+    avg._update_avg(value=100, timestamp=100)
+    assert list(avg.values) == [98, 99, 100]
+    with pytest.raises(ValueError):
+        AvgSignal(sig, 1, name='avg', mode='time')
+    with pytest.raises(ValueError):
+        AvgSignal(sig, 1, name='avg', mode='median')
+
+
+def test_avg_signal_ema():
+    logger.debug('test_avg_signal_ema')
+    sig = Signal(name='raw')
+    avg = AvgSignal(sig, 3, name='avg', mode='ema')
+    avg._update_avg(value=4)
+    assert avg.mean == 4
+    avg._update_avg(value=float('nan'))
+    assert avg.mean == 4
+    avg._update_avg(value=8)
+    assert avg.mean == 6
+    assert avg.count == 2
+    assert len(avg.values) == 0
+    avg.averages = 1
+    avg._update_avg(value=2)
+    assert avg.mean == 2
+
+
+class LateSignal(Signal):
+    connected = False
+
+
+def test_avg_signal_connection():
+    logger.debug('test_avg_signal_connection')
+    sig = LateSignal(name='raw', value=1)
+    pending = pending_connections()
+    threads = threading.active_count()
+    avgs = [AvgSignal(sig, 2, name='avg{}'.format(i)) for i in range(10)]
+    # No thread per signal
+    assert threading.active_count() <= threads + 1
+    assert pending_connections() == pending + 10
+    assert not any(avg.connected for avg in avgs)
+    sig.connected = True
+    wait_for(lambda: all(avg.connected for avg in avgs))
+    assert pending_connections() == pending
+    sig.put(3)
+    assert all(avg.value == 3 for avg in avgs)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out waiting'
+        time.sleep(0.01)
+
+
+def test_connection_callback_retry():
+    logger.debug('test_connection_callback_retry')
+    pending = pending_connections()
+    # Connected signals that retry their callback are not pending
+    stop = threading.Event()
+    calls = Mock(side_effect=lambda: stop.is_set() or False)
+    signals = [Signal(name='raw{}'.format(i)) for i in range(50)]
+    for sig in signals:
+        run_when_connected(sig, calls)
+    assert pending_connections() == pending
+    wait_for(lambda: calls.call_count >= 100)
+    assert pending_connections() == pending
+    stop.set()
+    # A slow callback does not hold up the others
+    slow = LateSignal(name='slow')
+    fast = LateSignal(name='fast')
+    release = threading.Event()
+    arrived = threading.Event()
+    run_when_connected(slow, release.wait)
+    run_when_connected(fast, arrived.set)
+    slow.connected = True
+    fast.connected = True
+    try:
+        assert arrived.wait(5)
+    finally:
+        release.set()
+
+
+def test_connection_waiter_releases_signals(caplog):
+    logger.debug('test_connection_waiter_releases_signals')
+    pending = pending_connections()
+    # A signal that never connects is not kept alive by the waiter
+    sig = LateSignal(name='never')
+    avg = AvgSignal(sig, 2, name='avg')
+    refs = [weakref.ref(sig), weakref.ref(avg)]
+    assert pending_connections() == pending + 1
+    del sig, avg
+    gc.collect()
+    assert all(ref() is None for ref in refs)
+    wait_for(lambda: pending_connections() == pending)
+    # Or the wait can time out
+    sig = LateSignal(name='late')
+    callback = Mock()
+    run_when_connected(sig, callback, timeout=0.2)
+    assert pending_connections() == pending + 1
+    wait_for(lambda: pending_connections() == pending)
+    assert 'Gave up waiting for late to connect' in caplog.text
+    sig.connected = True
+    time.sleep(0.2)
+    assert not callback.called
+
+
+def test_avg_signal_samples():
+    logger.debug('test_avg_signal_samples')
+    sig = Signal(name='raw')
+    avg = AvgSignal(sig, 5, name='avg', array_mode='samples')
+    sig.put(np.array([1, 2, 3]))
+    assert avg.value == 2
+    assert avg.count == 3
+    sig.put(np.array([4, np.nan, 6]))
+    assert avg.value == np.mean([2, 3, 4, 6])
+    assert avg.minimum == 2
+    assert avg.maximum == 6
+    assert np.isclose(avg.variance, np.var([2, 3, 4, 6]))
+    # Batches larger than the buffer keep the newest samples
+    sig.put(np.arange(20))
+    assert list(avg.values) == [15, 16, 17, 18, 19]
+    assert avg.value == 17
+    # Scalar updates still work after a batch
+    sig.put(np.array([0]))
+    assert avg.minimum == 0
+    assert avg.value == np.mean([16, 17, 18, 19, 0])
+
+
+@pytest.mark.parametrize('mode,kwargs', [('count', {}),
+                                         ('time', dict(duration=3)),
+                                         ('ema', {})])
+def test_avg_signal_samples_batches(mode, kwargs):
+    logger.debug('test_avg_signal_samples_batches')
+    # A batch of samples gives the same result as adding them one by one
+    sig = Signal(name='raw')
+    batch = AvgSignal(sig, 7, name='batch', mode=mode,
+                      array_mode='samples', **kwargs)
+    single = AvgSignal(sig, 7, name='single', mode=mode, **kwargs)
+    rng = np.random.RandomState(0)
+    for i in range(50):
+        values = rng.normal(size=rng.randint(0, 12))
+        values[rng.rand(len(values)) < 0.1] = np.nan
+        if i % 5 == 0:
+            values.sort()
+        batch._update_avg(value=values, timestamp=i)
+        for value in values:
+            single._update_avg(value=value, timestamp=i)
+        assert batch.count == single.count
+        for attr in ('mean', 'variance', 'minimum', 'maximum'):
+            assert np.isclose(getattr(batch, attr), getattr(single, attr),
+                              equal_nan=True)
+        assert np.array_equal(batch._stats.samples(), single._stats.samples(),
+                              equal_nan=True)
+    if mode != 'ema':
+        # Min and max stay on the sliding queues
+        assert list(batch._stats._min) == list(single._stats._min)
+        assert list(batch._stats._max) == list(single._stats._max)
+
+
+def test_avg_signal_waveform():
+    logger.debug('test_avg_signal_waveform')
+    sig = Signal(name='raw')
+    avg = AvgSignal(sig, 2, name='avg', array_mode='waveform')
+    sig.put(np.array([1, 2, 3]))
+    assert list(avg.value) == [1, 2, 3]
+    sig.put(np.array([3, np.nan, 5]))
+    assert list(avg.value) == [2, 2, 4]
+    assert list(avg.count) == [2, 1, 2]
+    sig.put(np.array([5, 6, 7]))
+    assert list(avg.value) == [4, 6, 6]
+    assert list(avg.minimum) == [3, 6, 5]
+    assert list(avg.maximum) == [5, 6, 7]
+    # Resizing keeps the newest waveforms
+    avg.averages = 1
+    assert list(avg.values[0]) == [5, 6, 7]
+    with pytest.raises(ValueError):
+        AvgSignal(sig, 2, name='avg', mode='ema', array_mode='waveform')
@@ -1,5 +1,10 @@
+import importlib
 import logging
-from unittest.mock import Mock
+import pkgutil
+import threading
+import time
+from enum import EnumMeta
+from unittest.mock import Mock, PropertyMock, patch
 
 import pytest
 from ophyd.device import Component as Cmp
@@ -7,7 +12,11 @@ from ophyd.signal import Signal
 from ophyd.sim import make_fake_device
 
 from pcdsdevices.state import (StatePositioner, PVStatePositioner,
-                               StateRecordPositioner, StateStatus)
+                               StateRecordPositioner, StateStatus,
+                               _make_states_enum, _state_lookup,
+                               move_states, warm_up_states)
+
+from conftest import HotfixFakeEpicsSignal
 
 logger = logging.getLogger(__name__)
 
@@ -95,6 +104,58 @@ def test_pvstate_positioner_logic():
         lim_obj.states_enum['defer']
 
 
+def test_pvstate_positioner_cached_position():
+    logger.debug('test_pvstate_positioner_cached_position')
+    lim_obj = LimCls('BASE', name='test')
+    lim_obj.lowlim.put(0)
+    lim_obj.highlim.put(1)
+    lim_obj.subscribe(Mock(), run=False)
+    lim_obj.lowlim.get = Mock(wraps=lim_obj.lowlim.get)
+    # Monitored positions do not read the sub-signals again
+    assert lim_obj.position == 'IN'
+    lim_obj.lowlim.put(1)
+    lim_obj.highlim.put(0)
+    assert lim_obj.position == 'OUT'
+    assert not lim_obj.lowlim.get.called
+
+
+def test_pvstate_positioner_table():
+    logger.debug('test_pvstate_positioner_table')
+    lim_obj = LimCls('BASE', name='test')
+    table = LimCls._compile_state_logic()
+    assert table is LimCls._compile_state_logic()
+    assert len(table) == 4
+    assert table[(0, 1)] == 'in'
+    assert table[(1, 0)] == 'out'
+    assert table[(0, 0)] == 'Unknown'
+    assert table[(1, 1)] == 'Unknown'
+    # Replay a batch of archived values
+    rows = [(0, 1), (1, 0), (1, 1), (0, 0), (5, 1)]
+    assert lim_obj.state.calc_readbacks(rows) == ['in', 'out', 'Unknown',
+                                                  'Unknown', 'Unknown']
+
+
+class FirstCls(LimCls):
+    _state_logic_mode = 'FIRST'
+    _state_logic = {'lowlim': {1: 'defer',
+                               2: 'out'},
+                    'highlim': {0: 'open',
+                                1: 'closed'}}
+    _states_alias = {}
+
+
+def test_pvstate_positioner_table_first():
+    logger.debug('test_pvstate_positioner_table_first')
+    first_obj = FirstCls('BASE', name='test')
+    # The first signal settles the state, whatever the second one holds
+    rows = [(2, 5), (2, None), (1, 0), (1, 5), (5, 0)]
+    assert first_obj.state.calc_readbacks(rows) == ['out', 'out', 'open',
+                                                    'Unknown', 'Unknown']
+    first_obj.lowlim.put(2)
+    first_obj.highlim.put(7)
+    assert first_obj.position == 'out'
+
+
 def test_pvstate_positioner_describe():
     logger.debug('test_pvstate_positioner_describe')
     lim_obj = LimCls('BASE', name='test')
@@ -139,6 +200,24 @@ def test_basic_subscribe():
     assert cb.called
 
 
+def test_start_after_move():
+    logger.debug('test_start_after_move')
+    lim_obj2 = LimCls2('BASE', name='test')
+    lim_obj2.move('IN', wait=True)
+    events = []
+    lim_obj2.subscribe(lambda *args, **kwargs: events.append('state'),
+                       event_type=lim_obj2.SUB_STATE, run=False)
+    start = Mock()
+    start.side_effect = lambda *args, **kwargs: events.append('start')
+    lim_obj2.subscribe(start, event_type=lim_obj2.SUB_START, run=False)
+    before = time.time()
+    lim_obj2.move('OUT', wait=True)
+    # The start is reported once the move was asked for, with the time it
+    # was asked for
+    assert events.index('start') > events.index('state')
+    assert before <= start.call_args[1]['timestamp'] <= time.time()
+
+
 def test_staterecord_positioner():
     """
     Nothing special can be done without live hosts, just make sure we can
@@ -158,6 +237,125 @@ def test_staterecord_positioner():
     assert cb.called
 
 
+def test_staterecord_warm_up():
+    logger.debug('test_staterecord_warm_up')
+
+    FakeState = make_fake_device(StateRecordPositioner)
+
+    class MyStates(FakeState):
+        states_list = ['YES', 'NO']
+
+    MyStates.state.cls = HotfixFakeEpicsSignal
+
+    devices = [MyStates('A:PV{}'.format(i), name='test{}'.format(i))
+               for i in range(5)]
+    # No metadata yet
+    assert not any(dev.states_ready for dev in devices)
+    assert warm_up_states(devices, timeout=0) == devices
+    for dev in devices:
+        dev.state.sim_set_enum_strs(('Unknown', 'Yes', 'No'))
+    assert warm_up_states(devices, timeout=1) == []
+    assert all(dev.states_ready for dev in devices)
+    dev = devices[0]
+    dev.state.sim_put(1)
+    assert dev.position == 'Yes'
+    assert dev.get_state('No').name == 'NO'
+    # The class definition is left alone
+    assert MyStates._states_alias == {}
+
+
+def test_staterecord_late_enum():
+    logger.debug('test_staterecord_late_enum')
+
+    FakeState = make_fake_device(StateRecordPositioner)
+
+    class MyStates(FakeState):
+        states_list = ['YES', 'NO']
+
+    MyStates.state.cls = HotfixFakeEpicsSignal
+
+    dev = MyStates('A:PV', name='test')
+    assert not dev.wait_for_states(timeout=0.2)
+    # Lookups use the static enum without asking for the enum strings
+    callers = []
+
+    def no_enum_strs():
+        callers.append(threading.current_thread())
+
+    with patch.object(HotfixFakeEpicsSignal, 'enum_strs',
+                      new_callable=PropertyMock) as enum_strs:
+        enum_strs.side_effect = no_enum_strs
+        assert dev.get_state('NO').name == 'NO'
+    assert threading.current_thread() not in callers
+    # Metadata that arrives while waiting is picked up
+    threading.Timer(0.2, dev.state.sim_set_enum_strs,
+                    args=(('Unknown', 'Yes', 'No'),)).start()
+    assert dev.wait_for_states(timeout=2)
+    assert dev.states_ready
+    assert dev.get_state('No').name == 'NO'
+
+
+class NoMetadataSignal(HotfixFakeEpicsSignal):
+    """
+    Fake signal that, like older ophyd, keeps no enum strings metadata.
+    """
+    def sim_set_enum_strs(self, enums):
+        self._enum_strs = enums
+
+
+def test_staterecord_enum_no_metadata():
+    logger.debug('test_staterecord_enum_no_metadata')
+
+    FakeState = make_fake_device(StateRecordPositioner)
+
+    class MyStates(FakeState):
+        states_list = ['YES', 'NO']
+
+    MyStates.state.cls = NoMetadataSignal
+
+    dev = MyStates('A:PV', name='test')
+    dev.state.sim_set_enum_strs(('Unknown', 'Yes', 'No'))
+    # Asked for on the callback pool instead
+    assert dev.wait_for_states(timeout=2)
+    dev.state.sim_put(1)
+    assert dev.position == 'Yes'
+
+
+def test_staterecord_enum_gives_up(caplog):
+    logger.debug('test_staterecord_enum_gives_up')
+
+    FakeState = make_fake_device(StateRecordPositioner)
+
+    class MyStates(FakeState):
+        states_list = ['YES', 'NO']
+        _enum_retries = 2
+
+    MyStates.state.cls = HotfixFakeEpicsSignal
+
+    # The enum strings are only requested from the IOC off this thread
+    callers = []
+
+    def no_enum_strs():
+        callers.append(threading.current_thread())
+
+    with patch.object(HotfixFakeEpicsSignal, 'enum_strs',
+                      new_callable=PropertyMock) as enum_strs:
+        enum_strs.side_effect = no_enum_strs
+        dev = MyStates('A:PV', name='test')
+        deadline = time.monotonic() + 5
+        while 'Gave up' not in caplog.text:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    assert callers
+    assert threading.current_thread() not in callers
+    assert not dev.states_ready
+    if hasattr(dev.state, 'SUB_META'):
+        # Metadata updates still finish the enum
+        dev.state.sim_set_enum_strs(('Unknown', 'Yes', 'No'))
+        assert dev.states_ready
+        assert dev.get_state('No').name == 'NO'
+
+
 def test_state_status():
     logger.debug('test_state_status')
     lim_obj = LimCls('BASE', name='test')
@@ -170,6 +368,79 @@ def test_state_status():
     # Check our callback was cleared
     assert status.check_value not in lim_obj._callbacks[lim_obj.SUB_STATE]
 
+    # The goal is resolved up front to every matching raw value
+    status = StateStatus(lim_obj, 'OUT')
+    assert {'out', 'OUT', 2, '2'} <= status._accepted_values
+    assert 'IN' not in status._accepted_values
+    assert not status.callback(value='in')
+    assert not status.callback(value='garbage')
+    assert status.callback(value='OUT')
+    assert not status.done
+
+
+def test_state_status_enum_rebuilt():
+    logger.debug('test_state_status_enum_rebuilt')
+
+    FakeState = make_fake_device(StateRecordPositioner)
+
+    class MyStates(FakeState):
+        states_list = ['YES', 'NO']
+
+    MyStates.state.cls = HotfixFakeEpicsSignal
+
+    dev = MyStates('A:PV', name='test')
+    # The status is made before the enum strings arrive
+    status = StateStatus(dev, 'NO')
+    assert 'No' not in status._accepted_values
+    dev.state.sim_set_enum_strs(('Unknown', 'Yes', 'No'))
+    assert dev.wait_for_states(timeout=2)
+    # The new alias is accepted once the enum is rebuilt
+    assert not status.callback(value='Yes')
+    assert status.callback(value='No')
+    assert 'No' in status._accepted_values
+
+
+class StuckCls(LimCls):
+    def _do_move(self, value):
+        pass
+
+
+def test_group_move():
+    logger.debug('test_group_move')
+    devices = [LimCls2('BASE{}'.format(i), name='test{}'.format(i))
+               for i in range(3)]
+    for device in devices:
+        device.move('IN', wait=True)
+    cb = Mock()
+    devices[0].subscribe(cb, event_type=devices[0].SUB_DONE, run=False)
+    status = move_states(devices, ['OUT'] * 3, wait=True)
+    assert status.success
+    assert all(device.position == 'OUT' for device in devices)
+    assert set(status.timing) == set(device.name for device in devices)
+    assert cb.called
+    # Everything is checked before anything moves
+    with pytest.raises(ValueError):
+        move_states(devices, ['IN', 'IN', 'Unknown'])
+    with pytest.raises(ValueError):
+        move_states(devices, ['IN', 'IN'])
+    assert all(device.position == 'OUT' for device in devices)
+    # Failures are reported per device
+    broken = LimCls('BASE', name='broken')
+    status = move_states([broken, devices[0]], ['IN', 'IN'])
+    assert status.done
+    assert not status.success
+    assert 'Move failed' in status.failures['broken']
+    assert devices[0].name in status.timing
+    stuck = StuckCls('BASE', name='stuck')
+    stuck.lowlim.put(1)
+    stuck.highlim.put(0)
+    status = move_states([stuck, devices[1]], ['IN', 'IN'], timeout=0.2)
+    time.sleep(1)
+    assert status.done
+    assert not status.success
+    assert 'Timed out' in status.failures['stuck']
+    assert devices[1].position == 'IN'
+
 
 class InconsistentState(StatePositioner):
     states_list = ['Unknown', 'IN', 'OUT']
@@ -188,3 +459,89 @@ def test_subcls_warning():
         StatePositioner('prefix', name='name')
     with pytest.raises(TypeError):
         PVStatePositioner('prefix', name='name')
+
+
+def all_subclasses(cls):
+    for subcls in cls.__subclasses__():
+        yield subcls
+        yield from all_subclasses(subcls)
+
+
+def test_state_lookup_tables():
+    logger.debug('test_state_lookup_tables')
+    # Import every module so that every shipped positioner class is defined
+    import pcdsdevices
+    for module in pkgutil.iter_modules(pcdsdevices.__path__):
+        importlib.import_module('pcdsdevices.' + module.name)
+
+    checked = 0
+    for cls in all_subclasses(StatePositioner):
+        if not cls.states_list or 'states_enum' in cls.__dict__:
+            continue
+        states_list = cls.states_list
+        if cls._unknown:
+            states_list = [cls._unknown] + states_list
+        try:
+            states_enum = _make_states_enum(cls.__name__ + 'States',
+                                            states_list, cls._states_alias)
+        except ValueError:
+            continue
+        table = _state_lookup(states_enum)
+        # The table must agree with the slow enum-based lookup for all inputs
+        for state in states_enum:
+            assert table[state.value] is states_enum(state.value)
+            assert table[str(state.value)] is states_enum(state.value)
+        for name in states_enum.__members__:
+            assert table[name] is states_enum[name]
+        # Identical definitions reuse the same enum and table
+        assert _make_states_enum(cls.__name__ + 'States', states_list,
+                                 cls._states_alias) is states_enum
+        checked += 1
+    assert checked > 0
+
+
+class ManyState(StatePositioner):
+    state = Cmp(PrefixSignal, 'many', value=1)
+    states_list = ['STATE{}'.format(i) for i in range(40)]
+    _states_alias = {'STATE{}'.format(i): 'ALIAS{}'.format(i)
+                     for i in range(40)}
+
+
+def test_state_lookup_no_enum_search():
+    logger.debug('test_state_lookup_no_enum_search')
+    device = ManyState('MANY', name='many')
+    states_enum = device.states_enum
+    inputs = (list(range(41)) + [str(i) for i in range(41)]
+              + list(states_enum.__members__) + list(states_enum))
+
+    def linear_get_state(value):
+        # The lookup used before the tables: try names, then values
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        try:
+            return states_enum[value]
+        except KeyError:
+            return states_enum(value)
+
+    expected = [linear_get_state(value) for value in inputs]
+    # Known inputs never fall back to searching the enum
+    with patch.object(EnumMeta, '__getitem__') as getitem, \
+            patch.object(EnumMeta, '__call__') as call:
+        found = [device.get_state(value) for value in inputs]
+    assert not getitem.called
+    assert not call.called
+    assert found == expected
+    # The table is built once per enum
+    assert _state_lookup(states_enum) is _state_lookup(device.states_enum)
+
+
+def test_state_lookup_fallback():
+    logger.debug('test_state_lookup_fallback')
+    states = IntState('INT', name='int')
+    # Inputs outside of the table still go through the enum
+    assert states.get_state('02').name == 'UNO'
+    assert states.get_state(states.states_enum.OUT).name == 'OUT'
+    with pytest.raises(ValueError):
+        states.get_state('NOT_A_STATE')
+    with pytest.raises(ValueError):
+        states.get_state(10)